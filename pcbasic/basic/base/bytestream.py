@@ -36,3 +36,11 @@ class ByteStream(BytesIO):
         self._pos = newpos
         # this is necessary for python2, where bytes(memoryview) gives a 'string representation'
         return bytes(bytearray(b))
+
+    def write(self, b):
+        """Write to bytestream; on overflow, fill up the buffer before failing."""
+        room = len(self._buffer) - self._pos
+        if 0 <= room < len(b):
+            BytesIO.write(self, b[:room])
+            raise ValueError('write beyond end of buffer')
+        return BytesIO.write(self, b)
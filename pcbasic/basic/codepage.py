@@ -9,6 +9,8 @@ This file is released under the GNU GPL version 3 or later.
 import unicodedata
 import logging
 import os
+import re
+import sys
 
 
 # mark bytes conversion explicitly
@@ -94,6 +96,18 @@ class Codepage(object):
         self.unicode_to_cp = dict((reversed(item) for item in self.cp_to_unicode.items()))
         if self.dbcs_num_chars > 0:
             self.dbcs = True
+        # whole-string translation tables, keyed by preserve set and by errors setting
+        self._decode_tables = {}
+        self._encode_tables = {}
+        # a mapping for CR or LF makes CR LF clusters convert differently from their parts
+        if set((u'\r', u'\n', u'\r\n')) & set(self.unicode_to_cp):
+            self._clusters = re.compile(u'[\r\n%s]' % CLUSTERING)
+        else:
+            self._clusters = re.compile(u'[%s]' % CLUSTERING)
+        # build the common tables up front; single-byte codepages convert through them
+        self.get_decode_table()
+        for errors in ('ignore', 'replace'):
+            self.get_encode_table(errors)
 
     def connects(self, c, d, bset):
         """Return True if c and d connect according to box-drawing set bset."""
@@ -119,6 +133,10 @@ class Codepage(object):
 
     def str_from_unicode(self, ucs, errors='ignore'):
         """Convert unicode string to codepage string."""
+        table = self._encode_tables.get(errors)
+        if table is not None and isinstance(ucs, unicode) and not self.has_clusters(ucs):
+            # no grapheme clusters: convert char by char in one go
+            return ucs.translate(table).encode('latin-1', errors)
         return b''.join(self.from_unicode(uc, errors=errors) for uc in split_graphemes(ucs))
 
     def to_unicode(self, cp, replace=u''):
@@ -127,12 +145,56 @@ class Codepage(object):
 
     def str_to_unicode(self, cps, preserve=b'', box_protect=True):
         """Convert codepage string to unicode string."""
+        if not self.dbcs:
+            table = self.get_decode_table(preserve)
+            return u''.join(map(table.__getitem__, bytearray(cps)))
         return Converter(self, preserve, box_protect).to_unicode(cps, flush=True)
 
     def get_converter(self, preserve=b''):
         """Get converter from codepage to unicode."""
         return Converter(self, preserve, self.box_protect)
 
+    def get_decode_table(self, preserve=b''):
+        """Get list of unicode sequences by byte value, or None for DBCS codepages."""
+        if self.dbcs:
+            return None
+        key = frozenset(preserve)
+        try:
+            return self._decode_tables[key]
+        except KeyError:
+            table = [
+                c.decode('ascii', errors='ignore') if c in key else self.cp_to_unicode[c]
+                for c in map(int2byte, range(256))
+            ]
+            self._decode_tables[key] = table
+            return table
+
+    def get_encode_table(self, errors='ignore'):
+        """\
+            Get unicode.translate table to codepage bytes, given as latin-1 characters.
+            Translated strings must be encoded to latin-1 with the same errors setting.
+            Only valid for strings without grapheme clusters; None if errors is not supported.
+        """
+        if errors not in ('ignore', 'replace'):
+            return None
+        try:
+            return self._encode_tables[errors]
+        except KeyError:
+            # latin-1 characters are not ascii and get replaced or dropped unless in the codepage
+            table = dict.fromkeys(range(128, 256), u'?' if errors == 'replace' else None)
+            table.update(
+                (ord(uc), cp.decode('latin-1'))
+                for uc, cp in self.unicode_to_cp.iteritems() if len(uc) == 1
+            )
+            # eascii NUL passes through
+            table[0] = u'\0'
+            self._encode_tables[errors] = table
+            return table
+
+    def has_clusters(self, ucs):
+        """Check if a unicode string has characters that can form grapheme clusters."""
+        return self._clusters.search(ucs) is not None
+
 
 ########################################
 # box drawing protection
@@ -193,6 +255,8 @@ class Converter(object):
         # may override box protection defaults
         self._box_protect = box_protect or self._cp.box_protect
         self._dbcs = self._cp.dbcs
+        # per-byte table for single-byte codepages
+        self._table = self._cp.get_decode_table(preserve)
         self._bset = -1
         self._last = b''
 
@@ -207,8 +271,18 @@ class Converter(object):
                 unistr += self._flush()
             return unistr
 
+    def get_state(self):
+        """Retrieve the buffered state, to be able to resume processing from this point."""
+        return self._buf, self._bset, self._last
+
+    def set_state(self, state):
+        """Resume processing from a previously retrieved state."""
+        self._buf, self._bset, self._last = state
+
     def to_unicode(self, s, flush=False):
         """Process codepage string, returning unicode string when ready."""
+        if self._table is not None:
+            return u''.join(map(self._table.__getitem__, bytearray(s)))
         return u''.join(
             (
                 seq.decode('ascii', errors='ignore')
@@ -706,6 +780,27 @@ GRAPHEME_BREAK = {
     ))
 }
 
+def _char_class(*intervals):
+    """Build regular expression character class contents for intervals of code points."""
+    # narrow builds can't represent astral code points as single chars
+    # they see them as surrogate pairs, so send all of those the slow way
+    ranges = [u'\ud800-\udfff'] if sys.maxunicode < 0x10000 else []
+    ranges.extend(
+        u'%s-%s' % (
+            re.escape(unichr(base._lower)),
+            re.escape(unichr(min(base._upper-1, sys.maxunicode)))
+        )
+        for interval in intervals for base in interval._base_intervals
+        if base._lower <= sys.maxunicode
+    )
+    return u''.join(ranges)
+
+# code points that can join with a neighbour into a grapheme cluster
+CLUSTERING = _char_class(*(
+    GRAPHEME_BREAK[key]
+    for key in ('Extend', 'SpacingMark', 'Regional_Indicator', 'L', 'V', 'T', 'LV', 'LVT')
+))
+
 def _get_grapheme_break(c):
     """Get grapheme break property of unicode char."""
     for key, value in GRAPHEME_BREAK.iteritems():
@@ -8,6 +8,7 @@ This file is released under the GNU GPL version 3 or later.
 
 import io
 import os
+import errno
 import struct
 import logging
 from contextlib import contextmanager
@@ -160,6 +161,8 @@ def safe_io(err=error.DEVICE_IO_ERROR):
         yield
     except EnvironmentError as e:
         logging.warning('I/O error on stream access: %s', e)
+        if e.errno == errno.ENOSPC:
+            raise error.BASICError(error.DISK_FULL)
         raise error.BASICError(err)
 
 
@@ -185,6 +188,9 @@ class RawFile(object):
         with safe_io():
             self._fhandle.close()
 
+    def flush(self):
+        """Write out any data held back by the file."""
+
     def read(self, num=-1):
         """Read num chars. If num==-1, read all available."""
         with safe_io():
@@ -217,6 +223,9 @@ class RawFile(object):
 # TAB x09 is not whitespace for input#. NUL \x00 and LF \x0a are.
 INPUT_WHITESPACE = b' \0\n'
 
+# control characters are not counted for the column position
+NONPRINTING = bytes(bytearray(range(32)))
+
 
 class DeviceSettings(object):
     """Device-level width and column settings."""
@@ -308,33 +317,24 @@ class TextFileBase(RawFile):
         """Write the string s to the file, taking care of width settings."""
         assert isinstance(s, bytes)
         # only break lines at the start of a new string. width 255 means unlimited width
-        s_width = 0
-        newline = False
         # find width of first line in s
-        for c in s:
-            if c in (b'\r', b'\n'):
-                newline = True
-                break
-            if c >= b' ':
-                # nonprinting characters including tabs are not counted for WIDTH
-                s_width += 1
+        first_line = s.split(b'\r', 1)[0].split(b'\n', 1)[0]
+        newline = len(first_line) < len(s)
+        # nonprinting characters including tabs are not counted for WIDTH
+        s_width = len(first_line.translate(None, NONPRINTING))
         if (can_break and self.width != 255 and self.col != 1 and
                 self.col-1 + s_width > self.width and not newline):
             self.write_line()
             self.col = 1
-        for c in s:
-            # don't replace CR or LF with CRLF when writing to files
-            if c == b'\r':
-                self._fhandle.write(c)
-                self.col = 1
-            else:
-                self._fhandle.write(c)
-                # nonprinting characters including tabs are not counted for WIDTH
-                if c >= b' ':
-                    self.col += 1
-                    # col-1 is a byte that wraps
-                    if self.col == 257:
-                        self.col = 1
+        # don't replace CR or LF with CRLF when writing to files
+        self._fhandle.write(s)
+        # CR resets the column, count printable chars from the last CR
+        last_cr = s.rfind(b'\r')
+        if last_cr >= 0:
+            self.col = 1
+            s = s[last_cr+1:]
+        # col-1 is a byte that wraps
+        self.col = (self.col - 1 + len(s.translate(None, NONPRINTING))) % 256 + 1
 
     def write_line(self, s=''):
         """Write string and follow with device-standard line break."""
@@ -651,6 +651,10 @@ class SCRNFile(RawFile):
                 and self.col != 1 and self.col-1 + s_width > self.width and not newline):
             self.screen.write_line(do_echo=do_echo)
             self._col = 1
+        if self._is_master:
+            # the master file has the screen's width, which the screen wraps at by itself
+            self.screen.write_chars(s, do_echo=do_echo)
+            return
         cwidth = self.screen.mode.width
         for c in s:
             if self.width <= cwidth and self.col > self.width:
@@ -19,13 +19,14 @@ import random
 import ntpath
 import logging
 import codecs
+from collections import OrderedDict
 
 from ..base import error
 from ..codepage import CONTROL
-from ...compat import get_short_pathname, get_free_bytes, is_hidden
 from .. import values
 from . import devicebase
-from .diskfiles import BinaryFile, TextFile, RandomFile, Locks
+from . import filesystems
+from .diskfiles import BinaryFile, TextFile, RandomFile, MappedRandomFile, Locks
 
 
 # GW-BASIC FILE CONTROL BLOCK structure:
@@ -97,6 +98,13 @@ ALLOWABLE_CHARS = set(string.ascii_letters + string.digits + b" !#$%&'()-@^_`{}~
 # posix access modes for BASIC modes INPUT, OUTPUT, RANDOM, APPEND
 ACCESS_MODES = {b'I': 'rb', b'O': 'wb', b'R': 'r+b', b'A': 'ab'}
 
+# number of directory listings to keep per device
+DIR_CACHE_SIZE = 16
+# number of compiled wildcard masks to keep
+MASK_CACHE_SIZE = 64
+# number of bytes read at a time from text files in a native encoding
+CODEC_CHUNK_SIZE = 4096
+
 
 ##############################################################################
 # exception handling
@@ -170,50 +178,114 @@ def dos_is_legal_name(dos_name):
             ((set(trunk) | set(ext)) <= ALLOWABLE_CHARS)
         )
 
-def dos_to_native_name(native_path, dosname, isdir):
-    """Find a matching native file name for a given normalised DOS name."""
-    try:
-        uni_name = dosname.decode(b'ascii')
-    except UnicodeDecodeError:
-        # non-ascii characters are not allowable for DOS filenames, no match
-        return None
-    # check if the 8.3 uppercase exists, prefer if so
-    if istype(native_path, uni_name, isdir):
-        return uni_name
-    # otherwise try in lexicographic order
-    try:
-        all_names = os.listdir(native_path)
-    except EnvironmentError:
-        # report no match if listdir fails
-        return None
-    for f in sorted(all_names):
-        # we won't match non-ascii anyway
-        try:
-            ascii_name = f.encode(b'ascii')
-        except UnicodeEncodeError:
-            continue
-        # don't match long names or non-legal dos names
-        if dos_is_legal_name(ascii_name):
-            try_name = dos_normalise_name(ascii_name)
-            if try_name == dosname and istype(native_path, f, isdir):
-                return f
-    return None
-
 def dos_name_matches(name, mask):
     """Whether native name element matches DOS wildcard mask."""
-    # convert wildcard mask to regexp
-    regexp = b'\\A'
-    for c in mask.upper():
-        if c == b'?':
-            regexp += b'.'
-        elif c == b'*':
-            # we won't need to match newlines, so dot is fine
-            regexp += b'.*'
-        else:
-            regexp += re.escape(c)
-    regexp += b'\\Z'
-    cregexp = re.compile(regexp)
-    return cregexp.match(name.upper()) is not None
+    return _compile_mask(mask).match(name.upper()) is not None
+
+_mask_cache = OrderedDict()
+
+def _compile_mask(mask):
+    """Get compiled regexp for DOS wildcard mask."""
+    mask = mask.upper()
+    try:
+        # move to most-recently-used position
+        cregexp = _mask_cache.pop(mask)
+    except KeyError:
+        # convert wildcard mask to regexp
+        regexp = b'\\A'
+        for c in mask:
+            if c == b'?':
+                regexp += b'.'
+            elif c == b'*':
+                # we won't need to match newlines, so dot is fine
+                regexp += b'.*'
+            else:
+                regexp += re.escape(c)
+        regexp += b'\\Z'
+        cregexp = re.compile(regexp)
+        if len(_mask_cache) >= MASK_CACHE_SIZE:
+            _mask_cache.popitem(last=False)
+    _mask_cache[mask] = cregexp
+    return cregexp
+
+
+##############################################################################
+# directory listing cache
+
+class DirectoryListing(object):
+    """Listing of a native directory, with the DOS name mapping precomputed."""
+
+    def __init__(self, filesystem, native_path, mtime):
+        """List the directory; raise EnvironmentError if not readable."""
+        self.mtime = mtime
+        self._fs = filesystem
+        self._native_path = native_path
+        self._names = filesystem.listdir(native_path)
+        self._name_set = set(self._names)
+        self._dirs_files = None
+        # DOS display names, filled in as they're requested
+        self.display_names = {}
+        # native names by normalised DOS name, in lexicographic order
+        self._by_dos_name = {}
+        for name in sorted(self._names):
+            # we won't match non-ascii anyway
+            try:
+                ascii_name = name.encode(b'ascii')
+            except UnicodeEncodeError:
+                continue
+            # don't match long names or non-legal dos names
+            if dos_is_legal_name(ascii_name):
+                self._by_dos_name.setdefault(dos_normalise_name(ascii_name), []).append(name)
+
+    def __contains__(self, native_name):
+        """Whether the native name was in the directory."""
+        return native_name in self._name_set
+
+    def match(self, dosname):
+        """Native names matching a normalised DOS name, in lexicographic order."""
+        return self._by_dos_name.get(dosname, ())
+
+    def get_dirs_files(self):
+        """Get native names of subdirectories and of files."""
+        if self._dirs_files is None:
+            dirs, fils = [], []
+            for name in self._names:
+                if self._fs.isdir(os.path.join(self._native_path, name)):
+                    dirs.append(name)
+                else:
+                    fils.append(name)
+            self._dirs_files = dirs, fils
+        dirs, fils = self._dirs_files
+        return list(dirs), list(fils)
+
+
+class DirectoryCache(object):
+    """Recently used directory listings, checked against the directory's modification time."""
+
+    def __init__(self, filesystem):
+        """Initialise the cache."""
+        self._fs = filesystem
+        self._listings = OrderedDict()
+
+    def get(self, native_path):
+        """Get an up-to-date listing; raise EnvironmentError if not readable."""
+        native_path = self._fs.abspath(native_path)
+        # get the time before listing, so that changes during listing invalidate the entry
+        mtime = self._fs.getmtime(native_path)
+        listing = self._listings.pop(native_path, None)
+        if listing is None or listing.mtime != mtime:
+            listing = DirectoryListing(self._fs, native_path, mtime)
+            if len(self._listings) >= DIR_CACHE_SIZE:
+                self._listings.popitem(last=False)
+        self._listings[native_path] = listing
+        return listing
+
+    def invalidate(self, native_path):
+        """Drop the listings of a directory and its subdirectories."""
+        native_path = self._fs.abspath(native_path)
+        for path in list(self._listings):
+            if path == native_path or path.startswith(os.path.join(native_path, u'')):
+                del self._listings[path]
 
 
 ##############################################################################
@@ -224,12 +296,15 @@ class DiskDevice(object):
 
     allowed_modes = b'IOR'
 
-    def __init__(self, letter, path, dos_cwd, codepage, utf8, universal):
+    def __init__(
+            self, letter, path, dos_cwd, codepage, utf8, universal, mmap_files=None, overlay=None
+        ):
         """Initialise a disk device."""
         # DOS drive letter
         self.letter = letter
         # mount root: this is a native filesystem path, using os.sep
-        self._native_root = path
+        # the file system is the host's, a RAM disk, an archive, or a copy-on-write overlay
+        self._fs, self._native_root = filesystems.mount(path, overlay)
         # code page for file system names and text file conversion
         self._codepage = codepage
         # current DOS working directory on this drive
@@ -246,13 +321,17 @@ class DiskDevice(object):
                 )
         # locks are drive-specific
         self._locks = Locks()
+        # directory listings for name matching and FILES
+        self._dir_cache = DirectoryCache(self._fs)
         # text file settings
         self._utf8 = utf8
         self._universal = universal
+        # random file setting: None for streams, or number of PUTs between flushes of the map
+        self._mmap_files = mmap_files
 
     def close(self):
         """Close disk device."""
-        pass
+        self._fs.close()
 
     def available(self):
         """Device is available."""
@@ -295,6 +374,11 @@ class DiskDevice(object):
             if mode in b'IAO':
                 # data file for input, output, append
                 return TextFile(fhandle, filetype, number, mode, self._locks, self._universal)
+            elif self._mmap_files is not None and number and self._fs.is_native:
+                # data file for random, memory-mapped; bound files and RAM disks are not mapped
+                return MappedRandomFile(
+                    fhandle, number, field, reclen, self._locks, self._mmap_files
+                )
             else:
                 # data file for random
                 return RandomFile(fhandle, number, field, reclen, self._locks)
@@ -330,6 +414,9 @@ class DiskDevice(object):
         # obtain a lock
         self._locks.open_file(dos_basename, number, mode, lock, access)
         try:
+            if mode != b'I' and not self._fs.exists(native_name):
+                # we're creating a file
+                self._dir_cache.invalidate(os.path.dirname(native_name))
             # open the underlying stream
             fhandle = self._open_stream(native_name, filetype, mode)
             # apply the BASIC file wrapper
@@ -344,10 +431,10 @@ class DiskDevice(object):
         try:
             # create file if in RANDOM or APPEND mode and doesn't exist yet
             # OUTPUT mode files are created anyway since they're opened with wb
-            if ((mode == b'A' or mode == b'R') and not os.path.exists(native_name)):
-                io.open(native_name, 'wb').close()
+            if ((mode == b'A' or mode == b'R') and not self._fs.exists(native_name)):
+                self._fs.open(native_name, 'wb').close()
             if mode == b'A':
-                f = io.open(native_name, 'r+b')
+                f = self._fs.open(native_name, 'r+b')
                 # APPEND mode is only valid for text files (which are seekable);
                 # first cut off EOF byte, if any.
                 try:
@@ -358,7 +445,7 @@ class DiskDevice(object):
                 except IOError:
                     pass
                 f.close()
-            return io.open(native_name, ACCESS_MODES[mode])
+            return self._fs.open(native_name, ACCESS_MODES[mode])
         except EnvironmentError as e:
             handle_oserror(e)
         except TypeError:
@@ -420,7 +507,7 @@ class DiskDevice(object):
         if name:
             path = os.path.join(path, self._get_native_name(path, name, defext, isdir, create))
         # get full normalised path
-        return os.path.abspath(path)
+        return self._fs.abspath(path)
 
     def chdir(self, dos_path):
         """Change working directory to given BASIC path."""
@@ -431,11 +518,15 @@ class DiskDevice(object):
 
     def mkdir(self, dos_path):
         """Create directory at given BASIC path."""
-        safe(os.mkdir, self._get_native_abspath(dos_path, defext=b'', isdir=True, create=True))
+        native_path = self._get_native_abspath(dos_path, defext=b'', isdir=True, create=True)
+        self._dir_cache.invalidate(os.path.dirname(native_path))
+        safe(self._fs.mkdir, native_path)
 
     def rmdir(self, dos_path):
         """Remove directory at given BASIC path."""
-        safe(os.rmdir, self._get_native_abspath(dos_path, defext=b'', isdir=True, create=False))
+        native_path = self._get_native_abspath(dos_path, defext=b'', isdir=True, create=False)
+        self._dir_cache.invalidate(os.path.dirname(native_path))
+        safe(self._fs.rmdir, native_path)
 
     def kill(self, dos_pathmask):
         """Remove regular files that match given BASIC path and mask."""
@@ -443,10 +534,7 @@ class DiskDevice(object):
         _, files = self._get_dirs_files(native_dir)
         # filter according to mask
         trunkmask, extmask = dos_splitext(dos_mask)
-        dos_to_native = {
-            self._get_dos_display_name(native_dir, _native_name): _native_name
-            for _native_name in files
-        }
+        dos_to_native = dict(zip(self._get_dos_display_names(native_dir, files), files))
         to_kill_dos = []
         for dos_name in dos_to_native:
             trunk, ext = dos_splitext(dos_name)
@@ -459,7 +547,7 @@ class DiskDevice(object):
             for _dos_name in to_kill_dos
             if (
                 dos_is_legal_name(_dos_name) and
-                not is_hidden(os.path.join(native_dir, dos_to_native[_dos_name]))
+                not self._fs.is_hidden(os.path.join(native_dir, dos_to_native[_dos_name]))
             )
         ]
         if not to_kill:
@@ -467,8 +555,9 @@ class DiskDevice(object):
         for dos_path in to_kill_dos:
             # don't delete open files
             self.require_file_not_open(dos_path)
+        self._dir_cache.invalidate(native_dir)
         for native_path in to_kill:
-            safe(os.remove, native_path)
+            safe(self._fs.remove, native_path)
 
     def rename(self, old_dospath, new_dospath):
         """Rename a file or directory."""
@@ -476,9 +565,12 @@ class DiskDevice(object):
                 old_dospath, defext=b'', isdir=False, create=False)
         new_native_path = self._get_native_abspath(
                 new_dospath, defext=b'', isdir=False, create=True)
-        if os.path.exists(new_native_path):
+        if self._fs.exists(new_native_path):
             raise error.BASICError(error.FILE_ALREADY_EXISTS)
-        safe(os.rename, old_native_path, new_native_path)
+        # renaming a directory also moves the directories below it
+        self._dir_cache.invalidate(os.path.dirname(old_native_path))
+        self._dir_cache.invalidate(os.path.dirname(new_native_path))
+        safe(self._fs.rename, old_native_path, new_native_path)
 
     def _split_pathmask(self, dos_pathmask):
         """Split pathmask into path and mask."""
@@ -499,10 +591,7 @@ class DiskDevice(object):
 
     def _get_dirs_files(self, native_path):
         """Get native filenames for native path."""
-        all_names = safe(os.listdir, native_path)
-        dirs = [n for n in all_names if os.path.isdir(os.path.join(native_path, n))]
-        fils = [n for n in all_names if not os.path.isdir(os.path.join(native_path, n))]
-        return dirs, fils
+        return safe(self._dir_cache.get, native_path).get_dirs_files()
 
     def listdir(self, pathmask):
         """Get directory listing."""
@@ -510,12 +599,12 @@ class DiskDevice(object):
         fils = []
         if dos_mask in (b'.', b'..'):
             # following GW, we just show a single dot if asked for either . or ..
-            dirs = [(u'', u'')]
+            dirs = [(b'', b'')]
         else:
             dirs, fils = self._get_dirs_files(native_path)
             # remove hidden files
-            dirs = [d for d in dirs if not is_hidden(os.path.join(native_path, d))]
-            fils = [f for f in fils if not is_hidden(os.path.join(native_path, f))]
+            dirs = [d for d in dirs if not self._fs.is_hidden(os.path.join(native_path, d))]
+            fils = [f for f in fils if not self._fs.is_hidden(os.path.join(native_path, f))]
             # filter according to mask
             dirs = self._filter_names(native_path, dirs + [u'.', u'..'], dos_mask)
             fils = self._filter_names(native_path, fils, dos_mask)
@@ -526,7 +615,9 @@ class DiskDevice(object):
         )
 
     def get_native_cwd(self):
-        """Return the current working directory in native format."""
+        """Return the current working directory in native format, or None if not on the host."""
+        if not self._fs.is_native:
+            return None
         return os.path.join(self._native_root, self._native_cwd)
 
     def get_cwd(self):
@@ -541,7 +632,7 @@ class DiskDevice(object):
 
     def get_free(self):
         """Return the number of free bytes on the drive."""
-        return get_free_bytes(self._native_root)
+        return self._fs.get_free(self._native_root)
 
     def require_file_exists(self, dospath):
         """Raise an error if the file is open or does not exist."""
@@ -587,12 +678,12 @@ class DiskDevice(object):
             # ends in single dot; first try with dot
             # but if it doesn't exist, base everything off dotless name
             uni_name = self._codepage.str_to_unicode(dos_name, box_protect=False)
-            if istype(native_path, uni_name, isdir):
+            if self._istype(native_path, uni_name, isdir):
                 return uni_name
             dos_name = dos_name[:-1]
         # check if the name exists as-is; should also match Windows short names.
         uni_name = self._codepage.str_to_unicode(dos_name, box_protect=False)
-        if istype(native_path, uni_name, isdir):
+        if self._istype(native_path, uni_name, isdir):
             return uni_name
         # original name does not exist; try matching dos-names or create one
         # normalise to 8.3
@@ -600,7 +691,7 @@ class DiskDevice(object):
         # check for non-legal characters & spaces (but clip off overlong names)
         if not dos_is_legal_name(norm_name):
             raise error.BASICError(error.BAD_FILE_NAME)
-        fullname = dos_to_native_name(native_path, norm_name, isdir)
+        fullname = self._dos_to_native_name(native_path, norm_name, isdir)
         if fullname:
             return fullname
         # not found
@@ -611,11 +702,42 @@ class DiskDevice(object):
         else:
             raise error.BASICError(name_err)
 
+    def _dos_to_native_name(self, native_path, dosname, isdir):
+        """Find a matching native file name for a given normalised DOS name."""
+        try:
+            uni_name = dosname.decode(b'ascii')
+        except UnicodeDecodeError:
+            # non-ascii characters are not allowable for DOS filenames, no match
+            return None
+        # check if the 8.3 uppercase exists, prefer if so
+        if self._istype(native_path, uni_name, isdir):
+            return uni_name
+        # otherwise try in lexicographic order
+        try:
+            listing = self._dir_cache.get(native_path)
+        except EnvironmentError:
+            # report no match if listdir fails
+            return None
+        for f in listing.match(dosname):
+            # check the type, and that the cached name still exists
+            if self._istype(native_path, f, isdir):
+                return f
+        return None
+
+    def _istype(self, native_path, native_name, isdir):
+        """Return whether a file exists and is a directory or regular."""
+        name = os.path.join(native_path, native_name)
+        try:
+            return self._fs.isdir(name) if isdir else self._fs.isfile(name)
+        except TypeError:
+            # happens for name == u'\0'
+            return False
+
     def _get_dos_display_name(self, native_dirpath, native_name):
         """Convert native name to short name or (not normalised or even legal) dos-style name."""
         native_path = os.path.join(native_dirpath, native_name)
         # get the short name if it exists, keep long name otherwise
-        native_path = get_short_pathname(native_path) or native_path
+        native_path = self._fs.get_short_pathname(native_path) or native_path
         native_name = os.path.basename(native_path)
         # see if we have a legal dos name that matches
         try:
@@ -635,31 +757,39 @@ class DiskDevice(object):
             ext = ext[:2] + b'+'
         return trunk + (b'.' if ext or not trunk else b'') + ext
 
+    def _get_dos_display_names(self, native_dirpath, native_names):
+        """Convert native names in a directory to dos-style names, using the listing cache."""
+        listing = None
+        if native_dirpath:
+            try:
+                listing = self._dir_cache.get(native_dirpath)
+            except EnvironmentError:
+                pass
+        display_names = []
+        for name in native_names:
+            try:
+                display_names.append(listing.display_names[name])
+            except (AttributeError, KeyError):
+                display_name = self._get_dos_display_name(native_dirpath, name)
+                # don't keep names that aren't in the listing, such as bound files
+                if listing is not None and name in listing:
+                    listing.display_names[name] = display_name
+                display_names.append(display_name)
+        return display_names
+
     def _filter_names(self, native_dirpath, native_names, dos_mask):
         """Apply case-insensitive filename filter to display names."""
         dos_mask = dos_mask or b'*.*'
         trunkmask, extmask = dos_splitext(dos_mask)
-        all_files = (self._get_dos_display_name(native_dirpath, name) for name in native_names)
+        trunk_regexp, ext_regexp = _compile_mask(trunkmask), _compile_mask(extmask)
+        all_files = self._get_dos_display_names(native_dirpath, native_names)
         split = [dos_splitext(dos_name) for dos_name in all_files]
         return sorted(
             (trunk, ext) for (trunk, ext) in split
-            if dos_name_matches(trunk, trunkmask) and dos_name_matches(ext, extmask)
+            if trunk_regexp.match(trunk.upper()) and ext_regexp.match(ext.upper())
         )
 
 
-##############################################################################
-# Native path utilities
-
-def istype(native_path, native_name, isdir):
-    """Return whether a file exists and is a directory or regular."""
-    name = os.path.join(native_path, native_name)
-    try:
-        return os.path.isdir(name) if isdir else os.path.isfile(name)
-    except TypeError:
-        # happens for name == u'\0'
-        return False
-
-
 ##############################################################################
 # Disk stream wrappers
 
@@ -681,27 +811,79 @@ class CodecReader(StreamWrapperBase):
     def __init__(self, stream, codepage, encoding):
         """Wrap the stream."""
         # don't convert universal newline (input setting)
-        #self._stream = io.TextIOWrapper(stream, encoding, 'replace', newline='\r\n')
         # in Python 2, io.TextIOWrapper doesn't work on file objects such as sys.stdout
-        self._stream = codecs.getreader(encoding)(stream, errors='replace')
-        self._buffer = b''
+        self._stream = stream
+        self._decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
         self._codepage = codepage
         self._encoding = encoding
+        # encoding for counting bytes held back; a byte order mark is only found at the start
+        self._count_encoding = 'utf-8' if encoding == 'utf-8-sig' else encoding
+        # converted bytes and our position in them
+        self._buffer = b''
+        self._pos = 0
+        # decoded text held back as its grapheme cluster may continue in the next chunk
+        self._pending = u''
+        self._eof = False
+        # reported and stream position to return to after seeking away, e.g. for LOF
+        self._parked = None
+
+    def _fill(self):
+        """Read, decode and convert the next chunk; return False at end of stream."""
+        if self._eof:
+            return False
+        chunk = self._stream.read(CODEC_CHUNK_SIZE)
+        self._eof = not chunk
+        unistr = self._pending + self._decoder.decode(chunk, final=self._eof)
+        split = len(unistr)
+        if not self._eof and unistr:
+            # hold back the last character and anything that may combine with it
+            split -= 1
+            while split > 0 and self._codepage.has_clusters(unistr[split]):
+                split -= 1
+        unistr, self._pending = unistr[:split], unistr[split:]
+        converted = self._codepage.str_from_unicode(unistr, errors='replace')
+        self._buffer = self._buffer[self._pos:] + converted
+        self._pos = 0
+        return True
 
     def read(self, n=-1):
         """Read n bytes from stream with cdepage conversion."""
-        if n > len(self._buffer):
-            unistr = self._stream.read(n - len(self._buffer))
-        elif n == -1:
-            unistr = self._stream.read()
-        else:
-            unistr = u''
-        converted = (self._buffer + self._codepage.str_from_unicode(unistr, errors='replace'))
-        if n < 0:
-            return converted
+        if self._parked is not None:
+            # we've moved away, what was read ahead no longer applies
+            self._parked = None
+            self._buffer, self._pos, self._pending, self._eof = b'', 0, u'', False
+            self._decoder.reset()
+        while n < 0 or len(self._buffer) - self._pos < n:
+            if not self._fill():
+                break
+        end = len(self._buffer) if n < 0 else min(len(self._buffer), self._pos + n)
+        output = self._buffer[self._pos:end]
+        self._pos = end
+        return output
+
+    def tell(self):
+        """Approximate position in the stream of the next byte to be read."""
+        if self._parked is not None:
+            return self._stream.tell()
+        held = self.encoded_length(self._buffer[self._pos:])
+        held += len(self._pending.encode(self._count_encoding, 'replace'))
+        held += len(self._decoder.getstate()[0])
+        return max(0, self._stream.tell() - held)
+
+    def encoded_length(self, s):
+        """Number of bytes the converted bytes s take up in the stream."""
+        unistr = self._codepage.str_to_unicode(s, preserve=CONTROL+(b'\x1A',))
+        return len(unistr.encode(self._count_encoding, 'replace'))
+
+    def seek(self, offset, whence=0):
+        """Move in the stream; seeking back to the position from tell() keeps what was read ahead."""
+        if self._parked is None:
+            self._parked = (self.tell(), self._stream.tell())
+        if whence == 0 and offset == self._parked[0]:
+            self._stream.seek(self._parked[1])
+            self._parked = None
         else:
-            output, self._buffer = converted[:n], converted[n:]
-            return output
+            self._stream.seek(offset, whence)
 
 
 class CodecWriter(StreamWrapperBase):
@@ -710,15 +892,19 @@ class CodecWriter(StreamWrapperBase):
     def __init__(self, stream, codepage, encoding):
         """Wrap the stream."""
         self._encoding = encoding
-        self._converter = codepage.get_converter(preserve=CONTROL  + (b'\x1A',))
+        preserve = CONTROL + (b'\x1A',)
+        self._converter = codepage.get_converter(preserve=preserve)
         # don't convert universal newline (output setting)
-        #self._stream = io.TextIOWrapper(stream, encoding, 'replace', newline='')
         # in Python 2, io.TextIOWrapper doesn't work on file objects such as sys.stdout
-        self._stream = codecs.getwriter(encoding)(stream, errors='replace')
+        self._stream = stream
+        self._encoder = codecs.getincrementalencoder(encoding)(errors='replace')
 
     def write(self, s):
         """Write to stream with codepage conversion."""
-        self._stream.write(self._converter.to_unicode(s))
+        unistr = self._converter.to_unicode(s)
+        # don't write a byte order mark before there's anything to write
+        if unistr:
+            self._stream.write(self._encoder.encode(unistr))
 
 
 ##############################################################################
@@ -778,10 +964,14 @@ class NameWrapper(object):
 class InternalDiskDevice(DiskDevice):
     """Internal disk device for special operations."""
 
-    def __init__(self, letter, path, cwd, codepage, utf8, universal):
+    def __init__(
+            self, letter, path, cwd, codepage, utf8, universal, mmap_files=None, overlay=None
+        ):
         """Initialise internal disk."""
         self._bound_files = {}
-        DiskDevice.__init__(self, letter, path, cwd, codepage, utf8, universal)
+        DiskDevice.__init__(
+            self, letter, path, cwd, codepage, utf8, universal, mmap_files, overlay
+        )
 
     def bind(self, file_name_or_object, name=None):
         """Bind a native file name or object to an internal name."""
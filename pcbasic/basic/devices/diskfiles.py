@@ -6,6 +6,9 @@ Disk Files
 This file is released under the GNU GPL version 3 or later.
 """
 
+import os
+import mmap
+import bisect
 import struct
 import string
 import ntpath
@@ -13,9 +16,20 @@ from contextlib import contextmanager
 
 from ..base.bytestream import ByteStream
 from ..base import error
+from .. import values
 from .devicebase import RawFile, TextFileBase, InputMixin, safe_io, TYPE_TO_MAGIC
 
 
+# size of read-ahead blocks for text files
+TEXT_BLOCK_SIZE = 4096
+# number of buffered characters needed to scan a whole line or entry in one go
+TEXT_SCAN_SIZE = 512
+# maximum number of bytes of records held by the PUT write-behind cache
+PUT_CACHE_SIZE = 262144
+# memory-mapped random files grow by this number of bytes at a time
+MAP_CHUNK_SIZE = 65536
+
+
 # binary file interface: file interface +
 #   seg
 #   offset
@@ -68,12 +82,17 @@ class BinaryFile(RawFile):
 class TextFile(TextFileBase, InputMixin):
     """Text file on disk device."""
 
+    # read ahead in blocks; scan lines and entries with bytes methods
+    _block_size = TEXT_BLOCK_SIZE
+
     def __init__(self, fhandle, filetype, number, mode, locks, universal):
         """Initialise text file object."""
         TextFileBase.__init__(self, fhandle, filetype, mode)
         self._locks = locks
         self._number = number
         self._universal = universal
+        # read-ahead buffer and position of the next character to be read
+        self._readahead, self._readpos = b'', 0
         # in append mode, we need to start at end of file
         if self.mode == b'A':
             with safe_io():
@@ -88,10 +107,52 @@ class TextFile(TextFileBase, InputMixin):
         TextFileBase.close(self)
         self._locks.close_file(self._number)
 
-    def read(self, n):
+    def _buffered(self):
+        """Number of characters read from the stream but not yet from the file."""
+        return len(self._readahead) - self._readpos
+
+    def _stream_buffered(self):
+        """Number of bytes read from the stream but not yet from the file."""
+        unread = self._readahead[self._readpos:]
+        try:
+            # the stream may convert from another encoding
+            return self._fhandle.encoded_length(unread)
+        except AttributeError:
+            return len(unread)
+
+    def _fill(self, num):
+        """Read ahead until num characters are buffered or the stream ends."""
+        to_read = num - self._buffered()
+        if to_read > 0:
+            with safe_io():
+                chunk = self._fhandle.read(max(to_read, self._block_size))
+            self._readahead = self._readahead[self._readpos:] + chunk
+            self._readpos = 0
+
+    def _advance(self, pos, previous):
+        """Drop characters up to pos from the buffer, last one being current."""
+        self._readpos = pos
+        self._previous, self._current = previous, self._readahead[pos-1:pos]
+
+    def peek(self, num):
+        """Return next num characters to be read; never returns more, fewer only at EOF."""
+        self._fill(num)
+        return self._readahead[self._readpos:self._readpos+num]
+
+    def read(self, num):
         """Read num characters."""
         self._locks.try_access(self._number, b'R')
-        return TextFileBase.read(self, n)
+        output = self.peek(num)
+        # check for \x1A - EOF char will actually stop further reading
+        if b'\x1A' in output:
+            output = output[:output.index(b'\x1A')]
+        self._readpos += len(output)
+        if len(output) <= 1:
+            self._previous = self._current
+        else:
+            self._previous = output[-2]
+        self._current = output[-1:]
+        return output
 
     def read_one(self):
         """Read one character, replacing CR LF with CR."""
@@ -109,8 +170,40 @@ class TextFile(TextFileBase, InputMixin):
             c = b'\r'
         return c
 
+    def _scan_line(self):
+        """Read a line without LF, NUL or EOF chars in one go; None if not possible."""
+        if not self._block_size:
+            return None
+        self._fill(TEXT_SCAN_SIZE)
+        start, buf = self._readpos, self._readahead
+        end = buf.find(b'\r', start, start + 256)
+        if end < 0:
+            # line must be cut at 255 characters
+            end = start + 255
+            if end >= len(buf):
+                return None
+        if buf.find(b'\n', start, end) >= 0 or buf.find(b'\x1a', start, end) >= 0:
+            return None
+        line = buf[start:end]
+        if len(line) == 255:
+            self._locks.try_access(self._number, b'R')
+            self._advance(end, buf[end-2:end-1])
+            return line, b'\r' if buf[end:end+1] == b'\r' else None
+        # we need to know the char after the CR to deal with CRLF
+        previous = buf[end-1:end] if end > start else self._current
+        if end + 1 >= len(buf) or previous == b'\n':
+            return None
+        self._locks.try_access(self._number, b'R')
+        self._advance(end + 1, previous)
+        if buf[end+1:end+2] == b'\n':
+            self._readpos += 1
+        return line, b'\r'
+
     def read_line(self):
         """Read line from text file, break on CR or CRLF (not LF, unless universal newlines)."""
+        scanned = self._scan_line()
+        if scanned:
+            return scanned
         s = []
         while True:
             c = self.read_one()
@@ -123,10 +216,73 @@ class TextFile(TextFileBase, InputMixin):
                 break
         return b''.join(s), c
 
+    def _scan_entry(self, typechar):
+        """Read an INPUT# entry without LF, NUL or EOF chars in one go; None if not possible."""
+        if not self._block_size:
+            return None
+        self._fill(TEXT_SCAN_SIZE)
+        buf = self._readahead
+        # skip leading spaces
+        start = self._readpos
+        while buf[start:start+1] == b' ':
+            start += 1
+        first = buf[start:start+1]
+        if not first or first in b'\0\n':
+            return None
+        if first == b'"' and typechar == values.STR:
+            # quoted string: no CRLF replacement inside quotes
+            end = buf.find(b'"', start + 1, start + 256)
+            word = buf[start+1:end]
+            if end < 0 or len(word) >= 255 or word[:1] in (b'\r', b'\n'):
+                return None
+            if b'\0' in word or b'\x1a' in word:
+                return None
+            self._locks.try_access(self._number, b'R')
+            self._advance(end + 1, buf[end-1:end])
+            # skip trailing whitespace before any comma or hard separator
+            self._skip_whitespace(b' ')
+            c = b'"'
+            if (self.peek(1) in b',\r'):
+                c = self.read_one()
+            return word, c
+        # unquoted entry ends at a comma or CR; numbers also at a space
+        seps = b',\r' if typechar == values.STR else b',\r '
+        end = min(
+            buf.find(sep, start, start + 255) % (start + 256)
+            for sep in seps
+        )
+        if end >= min(len(buf) - 1, start + 255):
+            return None
+        word = buf[start:end]
+        if b'\0' in word or b'\n' in word or b'\x1a' in word:
+            return None
+        previous = buf[end-1:end] if end > self._readpos else self._current
+        if previous == b'\n':
+            return None
+        self._locks.try_access(self._number, b'R')
+        c = buf[end:end+1]
+        self._advance(end + 1, previous)
+        if c == b'\r' and buf[end+1:end+2] == b'\n':
+            self._readpos += 1
+        elif c == b' ':
+            self._skip_whitespace(b' ')
+            if (self.peek(1) in b',\r'):
+                c = self.read_one()
+        # internal whitespace is included in strings, trailing whitespace is not
+        return word.rstrip(b' '), c
+
+    def input_entry(self, typechar, allow_past_end):
+        """Read a number or string entry for INPUT #."""
+        scanned = self._scan_entry(typechar)
+        if scanned:
+            return scanned
+        return InputMixin.input_entry(self, typechar, allow_past_end)
+
     def write(self, s, can_break=True):
         """Write string to file."""
         self._locks.try_access(self._number, b'W')
-        TextFileBase.write(self, s, can_break)
+        with safe_io():
+            TextFileBase.write(self, s, can_break)
 
     def write_line(self, s=b''):
         """Write string and newline to file."""
@@ -136,7 +292,7 @@ class TextFile(TextFileBase, InputMixin):
         """Get file pointer (LOC)."""
         with safe_io():
             if self.mode == b'I':
-                tell = self._fhandle.tell() - len(self._readahead)
+                tell = self._fhandle.tell() - self._stream_buffered()
                 return max(1, (127+tell) // 128)
             return self._fhandle.tell() // 128
 
@@ -163,6 +319,9 @@ class TextFile(TextFileBase, InputMixin):
 class FieldFile(TextFile):
     """Text file on FIELD."""
 
+    # don't read ahead: the buffer contents change under us on GET
+    _block_size = 0
+
     def __init__(self, field, reclen):
         """Initialise text file object."""
         # don't let the field file use device locks
@@ -198,31 +357,28 @@ class FieldFile(TextFile):
             self._fhandle.flush()
             self.mode = b'I'
         elif new_mode == b'O' and self.mode == b'I':
-            self._fhandle.seek(-len(self._readahead), 1)
-            self._readahead = []
+            self._fhandle.seek(-self._buffered(), 1)
+            self._readahead, self._readpos = b'', 0
             self._previous, self._current = b'', b''
             self.mode = b'O'
 
     def _check_overflow(self):
         """Check for FIELD OVERFLOW."""
         # FIELD overflow happens if last byte in record has been read or written
-        if self._fhandle.tell() - len(self._readahead) >= self._reclen:
+        if self._fhandle.tell() - self._buffered() >= self._reclen:
             raise error.BASICError(error.FIELD_OVERFLOW)
 
-    def set_buffer(self, contents):
-        """Set the contents of the buffer."""
-        # take contents and pad with NULL to required size
-        try:
-            self._field.view_buffer()[:self._reclen] = contents.ljust(self._reclen, b'\0')
-        except ValueError:
-            # can't modify size of memoryview
-            raise error.BASICError(error.FIELD_OVERFLOW)
-        # reset field text file loc
+    def view_record(self):
+        """Get a writeable view of the record in the buffer, for GET."""
+        return self._field.view_buffer()[:self._reclen]
+
+    def rewind(self):
+        """Reset the field text file location after the buffer has been filled."""
         self._fhandle.seek(0)
 
     def get_buffer(self):
         """Get a copy of the contents of the buffer."""
-        return bytearray(self._field.view_buffer())
+        return self._field.view_buffer().tobytes()
 
     def write(self, bytestr, can_break=True):
         """Write bytes to buffer."""
@@ -250,9 +406,21 @@ class RandomFile(RawFile):
         # position at start of file
         self._recpos = 0
         self._fhandle.seek(0)
+        # stream position, in bytes
+        self._pos = 0
+        # write-behind cache: runs of bytes written by PUT but not yet to the stream, by offset
+        # overlapping writes are merged into one run, as a record PUT writes the whole FIELD buffer
+        # these are lost if we crash before a flush on CLOSE, LOCK, SHELL, CHAIN or error
+        self._dirty = {}
+        self._dirty_offsets = []
+        self._dirty_size = 0
+        # file length when the cache was started, and end of cached records
+        self._cached_length = 0
+        self._dirty_end = 0
 
     def close(self):
         """Close random-access file."""
+        self.flush()
         RawFile.close(self)
         self._locks.close_file(self._number)
 
@@ -315,13 +483,16 @@ class RandomFile(RawFile):
         self._set_record_pos(pos)
         # exceptionally, GET is allowed if the file holding the lock is open for OUTPUT
         self._locks.try_record_access(self._number, self._recpos+1, self._recpos+1, b'R')
-        if self.eof():
-            contents = b'\0' * self.reclen
-        else:
-            with safe_io():
-                contents = self._fhandle.read(self.reclen)
-        # take contents and pad with NULL to required size
-        self._field_file.set_buffer(contents)
+        # read straight into the FIELD buffer; FIELD variables are views on it
+        record = self._field_file.view_record()
+        count = 0
+        if not self.eof():
+            count = self._read_into(self._pos, record)
+            self._pos += count
+        # pad with NULL to required size
+        if count < len(record):
+            record[count:] = b'\0' * (len(record) - count)
+        self._field_file.rewind()
         self._recpos += 1
 
     def put(self, pos):
@@ -329,28 +500,114 @@ class RandomFile(RawFile):
         self._set_record_pos(pos)
         self._locks.try_record_access(self._number, self._recpos+1, self._recpos+1, b'W')
         current_length = self.lof()
-        with safe_io():
-            if self._recpos > current_length:
-                self._fhandle.seek(0, 2)
-                numrecs = self._recpos - current_length
-                self._fhandle.write(b'\0' * numrecs * self.reclen)
-            self._fhandle.write(bytes(self._field_file.get_buffer()))
+        contents = self._field_file.get_buffer()
+        if self._recpos > current_length:
+            # pad with empty records from the end of file
+            contents = b'\0' * (self._recpos - current_length) * self.reclen + contents
+            self._pos = current_length
+        self._write_at(self._pos, contents)
+        self._pos += len(contents)
         self._recpos += 1
 
     def _set_record_pos(self, pos):
         """Move record pointer to new position."""
         if pos is not None:
             # first record is number 1
-            with safe_io():
-                self._fhandle.seek((pos-1) * self.reclen)
+            self._pos = (pos-1) * self.reclen
             self._recpos = pos - 1
 
+    def _find_dirty(self, start, stop):
+        """Return offsets of the cached runs overlapping the byte range."""
+        first = bisect.bisect_right(self._dirty_offsets, start)
+        if first and self._dirty_offsets[first-1] + len(self._dirty[self._dirty_offsets[first-1]]) > start:
+            first -= 1
+        last = bisect.bisect_left(self._dirty_offsets, stop)
+        return self._dirty_offsets[first:last]
+
+    def _read_into(self, offset, view):
+        """Read bytes at the given position into a writeable view, from stream or cache."""
+        length = len(view)
+        dirty = self._find_dirty(offset, offset + length)
+        if dirty:
+            run = self._dirty[dirty[0]]
+            if dirty[0] <= offset and offset + length <= dirty[0] + len(run):
+                view[:] = run[offset-dirty[0]:offset-dirty[0]+length]
+                return length
+            self.flush()
+        elif self._dirty and offset + length > self._cached_length:
+            # cached runs may extend the file past the range
+            self.flush()
+        with safe_io():
+            self._fhandle.seek(offset)
+            return self._fhandle.readinto(view)
+
+    def _write_at(self, offset, contents):
+        """Write bytes to the stream at the given position, through the cache if unshared."""
+        if self._locks.is_shared(self._number):
+            # other handles on the same file read the stream, not our cache
+            self.flush()
+            with safe_io():
+                self._fhandle.seek(offset)
+                self._fhandle.write(contents)
+            return
+        if not self._dirty:
+            self._cached_length = self._stream_length()
+        stop = offset + len(contents)
+        dirty = self._find_dirty(offset, stop)
+        if len(dirty) == 1 and dirty[0] <= offset:
+            # overwrite or extend the run in place
+            run = self._dirty[dirty[0]]
+            self._dirty_size -= len(run)
+            run[offset-dirty[0]:stop-dirty[0]] = contents
+        else:
+            # merge overlapping runs into a new one; later bytes win
+            start = min([offset] + dirty)
+            run = bytearray(max([stop] + [_o + len(self._dirty[_o]) for _o in dirty]) - start)
+            for old in dirty:
+                old_run = self._dirty.pop(old)
+                self._dirty_offsets.remove(old)
+                self._dirty_size -= len(old_run)
+                run[old-start:old-start+len(old_run)] = old_run
+            run[offset-start:stop-start] = contents
+            bisect.insort(self._dirty_offsets, start)
+            self._dirty[start] = run
+        self._dirty_size += len(run)
+        self._dirty_end = max(self._dirty_end, stop)
+        if self._dirty_size >= PUT_CACHE_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Write cached runs to the stream, merging adjacent ones."""
+        if not self._dirty:
+            return
+        runs = []
+        for offset in self._dirty_offsets:
+            if runs and runs[-1][1] == offset:
+                runs[-1][1] += len(self._dirty[offset])
+                runs[-1][2].append(bytes(self._dirty[offset]))
+            else:
+                runs.append([offset, offset + len(self._dirty[offset]), [bytes(self._dirty[offset])]])
+        with safe_io():
+            for start, _, records in runs:
+                self._fhandle.seek(start)
+                self._fhandle.write(b''.join(records))
+            # make the records visible to other processes, e.g. after LOCK or SHELL
+            self._fhandle.flush()
+        self._dirty, self._dirty_offsets, self._dirty_size = {}, [], 0
+        self._dirty_end = 0
+
     def loc(self):
         """Get number of record just past, for LOC."""
         return self._recpos
 
     def lof(self):
         """Get length of file, in bytes, for LOF."""
+        if self._dirty:
+            return max(self._cached_length, self._dirty_end)
+        return self._stream_length()
+
+    def _stream_length(self):
+        """Get length of the underlying stream."""
         with safe_io():
             current = self._fhandle.tell()
             self._fhandle.seek(0, 2)
@@ -360,13 +617,110 @@ class RandomFile(RawFile):
 
     def lock(self, start, stop):
         """Lock range of records."""
+        self.flush()
         self._locks.acquire_record_lock(self._number, start, stop)
 
     def unlock(self, start, stop):
         """Unlock range of records."""
+        self.flush()
         self._locks.release_record_lock(self._number, start, stop)
 
 
+class MappedRandomFile(RandomFile):
+    """Random-access file on disk device, accessed through a memory map."""
+
+    def __init__(self, fhandle, number, field, reclen, locks, flush_interval=0):
+        """Initialise memory-mapped random-access file."""
+        RandomFile.__init__(self, fhandle, number, field, reclen, locks)
+        # number of PUTs between flushes; 0 means flush only on CLOSE
+        self._flush_interval = flush_interval
+        self._puts = 0
+        # an empty file can't be mapped
+        self._map = None
+        # length of the file, without the zeros added to grow the map in chunks
+        self._length = self._file_size()
+        self._map_file(self._length)
+
+    def _file_size(self):
+        """Get the length of the file on disk."""
+        with safe_io():
+            return os.fstat(self._fhandle.fileno()).st_size
+
+    def _map_file(self, length):
+        """(Re)map the whole file, growing it to at least the given length."""
+        with safe_io():
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._fhandle.flush()
+            # never shrink the file, another handle may have grown it
+            if length > self._file_size():
+                self._fhandle.truncate(length)
+            length = self._file_size()
+            if length:
+                self._map = mmap.mmap(self._fhandle.fileno(), length, access=mmap.ACCESS_WRITE)
+
+    def _trim(self):
+        """Remove the zeros added to grow the map."""
+        if self._map is not None and len(self._map) > self._length:
+            with safe_io():
+                self._map.close()
+                self._map = None
+                self._fhandle.truncate(self._length)
+            self._map_file(self._length)
+
+    def flush(self):
+        """Write changes in the mapping to disk and trim the file to its length."""
+        if self._map is not None:
+            with safe_io():
+                self._map.flush()
+        self._trim()
+        self._puts = 0
+
+    def close(self):
+        """Close memory-mapped random-access file."""
+        self.flush()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        RandomFile.close(self)
+
+    def _read_into(self, offset, view):
+        """Read bytes from the mapping into a writeable view."""
+        end = min(offset + len(view), self.lof())
+        if self._map is None or end > len(self._map):
+            # another handle has grown the file
+            self._map_file(end)
+        if self._map is None or end <= offset:
+            return 0
+        data = self._map[offset:end]
+        view[:len(data)] = data
+        return len(data)
+
+    def _write_at(self, offset, contents):
+        """Write bytes to the mapping, growing the file as needed."""
+        end = offset + len(contents)
+        length = max(self.lof(), end)
+        if self._map is None or end > len(self._map):
+            map_length = length
+            if not self._locks.is_shared(self._number):
+                # the zeros at the end are trimmed on flush, before anyone else opens the file
+                map_length = -(-length // MAP_CHUNK_SIZE) * MAP_CHUNK_SIZE
+            self._map_file(map_length)
+        self._length = length
+        self._map[offset:end] = contents
+        self._puts += 1
+        if self._puts == self._flush_interval:
+            self.flush()
+
+    def lof(self):
+        """Get length of file, in bytes, for LOF."""
+        if self._map is None or len(self._map) <= self._length:
+            # no zeros of ours at the end; another handle may have changed the file
+            self._length = self._file_size()
+        return self._length
+
+
 ###############################################################################
 # Locks
 
@@ -376,11 +730,43 @@ class LockingParameters(object):
 
     def __init__(self, dos_name, mode, lock_type, access):
         """Build a record."""
-        self.name = ntpath.basename(dos_name).upper()
+        self.name = normalise_lock_name(dos_name)
         self.lock_set = set()
         self.lock_type = lock_type
         self.access = access
         self.mode = mode
+        # record lock ranges sorted by start, with the running maximum of their stops
+        self._starts, self._stops = [], []
+
+    def add_lock(self, start, stop):
+        """Add a whole-file (None, None) or record range lock."""
+        self.lock_set.add((start, stop))
+        self._reindex()
+
+    def remove_lock(self, start, stop):
+        """Remove a lock; KeyError if the exact range isn't locked."""
+        self.lock_set.remove((start, stop))
+        self._reindex()
+
+    def _reindex(self):
+        """Rebuild the range index."""
+        ranges = sorted(lock for lock in self.lock_set if lock != (None, None))
+        self._starts = [start for start, _ in ranges]
+        self._stops = []
+        for _, stop in ranges:
+            self._stops.append(max(stop, self._stops[-1]) if self._stops else stop)
+
+    def is_locked(self, record):
+        """Check whether a record is in a locked range or the whole file is locked."""
+        if (None, None) in self.lock_set:
+            return True
+        index = bisect.bisect_right(self._starts, record)
+        return bool(index) and self._stops[index-1] >= record
+
+
+def normalise_lock_name(dos_name):
+    """Files are the same for locking purposes if their DOS basenames are."""
+    return ntpath.basename(dos_name).upper()
 
 
 class Locks(object):
@@ -390,14 +776,22 @@ class Locks(object):
         """Initialise locks."""
         # dict of LockingParameters objects, one for each open disk file, by file number
         self._locking_parameters = {}
+        # the same LockingParameters objects, by normalised name and file number
+        self._open_by_name = {}
 
     def list_open(self, name, exclude_number=None):
         """Retrieve a list of files open on the same disk device."""
         return [
-            f for number, f in self._locking_parameters.iteritems()
-            if f.name == ntpath.basename(name).upper() and number != exclude_number
+            f for number, f in self._open_by_name.get(normalise_lock_name(name), {}).iteritems()
+            if number != exclude_number
         ]
 
+    def is_shared(self, number):
+        """Return whether the file is also open under another number."""
+        if not number:
+            return False
+        return bool(self.list_open(self._locking_parameters[number].name, number))
+
     def open_file(self, name, number, mode, lock_type, access):
         """Register a disk file and try to acquire a file lock."""
         already_open = self.list_open(name)
@@ -434,14 +828,21 @@ class Locks(object):
         # but second file gets checked for ''
         if lock_type and not access:
             access = b'RW'
-        self._locking_parameters[number] = LockingParameters(name, mode, lock_type, access)
+        self.close_file(number)
+        params = LockingParameters(name, mode, lock_type, access)
+        self._locking_parameters[number] = params
+        self._open_by_name.setdefault(params.name, {})[number] = params
 
     def close_file(self, number):
         """Deregister disk file."""
         try:
-            del self._locking_parameters[number]
+            params = self._locking_parameters.pop(number)
         except KeyError:
-            pass
+            return
+        same_name = self._open_by_name[params.name]
+        del same_name[number]
+        if not same_name:
+            del self._open_by_name[params.name]
 
     def try_access(self, number, access):
         """Attempt to access a file."""
@@ -465,36 +866,34 @@ class Locks(object):
     def _try_record_lock(self, number, start, stop, allow_self=True, read_only=False):
         """Attempt to access a record."""
         this_file = self._locking_parameters[number]
-        other_locks = [
-            f.lock_set for f in self.list_open(this_file.name, number if allow_self else None)
+        others = [
+            f for f in self.list_open(this_file.name, number if allow_self else None)
             # access parameter only exists to allow reading a record on locked OUTPUT file
             if not (f.mode in b'OA' and read_only)
         ]
-        other_lock_set = set.union(*other_locks) if other_locks else set()
         # access in violation of other's LOCK#: permission denied
         # whole-file access sought
         if stop is None and start is None:
-            if other_lock_set:
+            if any(f.lock_set for f in others):
                 raise error.BASICError(error.PERMISSION_DENIED)
         else:
-            # range access sought
-            for start_1, stop_1 in other_lock_set:
-                if (stop_1 is None and start_1 is None
-                            or (start >= start_1 and start <= stop_1)
-                            or (stop >= start_1 and stop <= stop_1)):
+            # range access sought: denied if either end is locked
+            # note that a locked range strictly inside the sought range is not detected
+            for f in others:
+                if f.is_locked(start) or f.is_locked(stop):
                     raise error.BASICError(error.PERMISSION_DENIED)
 
     def acquire_record_lock(self, number, start, stop):
         """Acquire a lock on a range of records."""
         self._try_record_lock(number, start, stop, allow_self=False)
         this_file = self._locking_parameters[number]
-        this_file.lock_set.add((start, stop))
+        this_file.add_lock(start, stop)
 
     def release_record_lock(self, number, start, stop):
         """Acquire a lock on a range of records."""
         this_file = self._locking_parameters[number]
         # permission denied if the exact record range wasn't given before
         try:
-            this_file.lock_set.remove((start, stop))
+            this_file.remove_lock(start, stop)
         except KeyError:
             raise error.BASICError(error.PERMISSION_DENIED)
@@ -43,7 +43,7 @@ class Files(object):
             self, values, memory, queues, keyboard, display,
             max_files, max_reclen, serial_buffer_size,
             device_params, current_device, mount_dict,
-            utf8, universal
+            utf8, universal, mmap_files=None, overlay_dict=None
         ):
         """Initialise files."""
         # for wait() in files_
@@ -56,7 +56,7 @@ class Files(object):
         self._init_devices(
             values, queues, display, keyboard,
             device_params, current_device, mount_dict,
-            serial_buffer_size, utf8, universal
+            serial_buffer_size, utf8, universal, mmap_files, overlay_dict
         )
 
     ###########################################################################
@@ -76,6 +76,11 @@ class Files(object):
             f.close()
         self.files = {}
 
+    def flush_all(self):
+        """Write out data held back by all files."""
+        for f in self.files.values():
+            f.flush()
+
     def open(
             self, number, description, filetype, mode=b'I', access=b'', lock=b'',
             reclen=128, seg=0, offset=0, length=0
@@ -86,6 +91,8 @@ class Files(object):
             raise error.BASICError(error.BAD_FILE_NUMBER)
         if number in self.files:
             raise error.BASICError(error.FILE_ALREADY_OPEN)
+        # the file may already be open under another number
+        self.flush_all()
         mode = mode.upper()
         device, dev_param = self._get_device_param(description, mode)
         # get the field buffer
@@ -126,7 +133,7 @@ class Files(object):
     def _init_devices(
             self, values, queues, display, keyboard,
             device_params, current_device, mount_dict,
-            serial_in_size, utf8, universal
+            serial_in_size, utf8, universal, mmap_files, overlay_dict
         ):
         """Initialise devices."""
         # screen device, for files_()
@@ -154,7 +161,9 @@ class Files(object):
         self.kybd_file = self._devices[b'KYBD:'].device_file
         self.lpt1_file = self._devices[b'LPT1:'].device_file
         # disks
-        self._init_disk_devices(mount_dict, current_device, codepage, utf8, universal)
+        self._init_disk_devices(
+            mount_dict, current_device, codepage, utf8, universal, mmap_files, overlay_dict
+        )
 
     def close_devices(self):
         """Close device master files."""
@@ -566,12 +575,14 @@ class Files(object):
 
     def _init_disk_devices(
             self, mount_dict, current_device,
-            codepage, utf8, universal
+            codepage, utf8, universal, mmap_files, overlay_dict
         ):
         """Initialise disk devices."""
         # use None to request default mounts, use {} for no mounts
         if mount_dict is None:
             mount_dict = DEFAULT_MOUNTS
+        # copy-on-write overlay locations, by drive letter
+        overlay_dict = overlay_dict or {}
         # disk devices
         for letter in DRIVE_LETTERS:
             if not mount_dict:
@@ -582,7 +593,10 @@ class Files(object):
                 path, cwd = None, u''
             # treat device @: separately - internal disk
             disk_class = disk.InternalDiskDevice if letter == b'@' else disk.DiskDevice
-            self._devices[letter + b':'] = disk_class(letter, path, cwd, codepage, utf8, universal)
+            self._devices[letter + b':'] = disk_class(
+                letter, path, cwd, codepage, utf8, universal, mmap_files,
+                overlay_dict.get(letter)
+            )
         # allow upper or lower case, unicode or str, with or without :
         if isinstance(current_device, unicode):
             current_device = current_device.encode('ascii')
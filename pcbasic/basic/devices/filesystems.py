@@ -0,0 +1,876 @@
+"""
+PC-BASIC - devices.filesystems
+File systems underlying disk devices
+
+(c) 2013--2018 Rob Hagemans
+This file is released under the GNU GPL version 3 or later.
+"""
+
+import os
+import io
+import errno
+import logging
+import zipfile
+import tarfile
+from collections import OrderedDict
+
+from ...compat import get_short_pathname, get_free_bytes, is_hidden
+
+
+# mount path that requests a RAM disk, optionally followed by its size in bytes
+MEMORY_MOUNT = u':memory:'
+
+# free space reported on a RAM disk without quota
+UNLIMITED_FREE = 0x7fffffff
+
+# total size of decompressed archive members to keep
+ARCHIVE_CACHE_SIZE = 4194304
+
+
+def mount(path, upper=None):
+    """Get the file system and its root path for a mount path, with optional overlay."""
+    if upper is not None and path:
+        base, base_root = mount(path)
+        overlay, overlay_root = mount(upper)
+        if base_root and overlay_root and not isinstance(overlay, ArchiveFileSystem):
+            return OverlayFileSystem(base, base_root, overlay, overlay_root), os.sep
+        logging.warning(u'Could not use %s as overlay for %s', upper, path)
+        return base, base_root
+    if path and path.startswith(MEMORY_MOUNT):
+        quota = path[len(MEMORY_MOUNT):]
+        try:
+            quota = int(quota) if quota else 0
+        except ValueError:
+            logging.warning(u'Could not set RAM disk size to %s', quota)
+            quota = 0
+        return MemoryFileSystem(quota), os.sep
+    if path and os.path.isfile(path):
+        try:
+            return ArchiveFileSystem(path), os.sep
+        except (EnvironmentError, zipfile.BadZipfile, tarfile.TarError) as e:
+            logging.warning(u'Could not mount archive %s: %s', path, e)
+            return NativeFileSystem(), None
+    return NativeFileSystem(), path
+
+
+##############################################################################
+# host file system
+
+class NativeFileSystem(object):
+    """Host file system, accessed through native paths."""
+
+    # paths on this file system can be used by other processes
+    is_native = True
+
+    def abspath(self, path):
+        """Normalised absolute path."""
+        return os.path.abspath(path)
+
+    def exists(self, path):
+        """Whether a path exists."""
+        return os.path.exists(path)
+
+    def isdir(self, path):
+        """Whether a path is a directory."""
+        return os.path.isdir(path)
+
+    def isfile(self, path):
+        """Whether a path is a regular file."""
+        return os.path.isfile(path)
+
+    def getmtime(self, path):
+        """Modification time of a path."""
+        return os.stat(path).st_mtime
+
+    def listdir(self, path):
+        """Names in a directory."""
+        return os.listdir(path)
+
+    def open(self, path, mode):
+        """Open a binary stream with Python mode rb, wb, r+b or ab."""
+        return io.open(path, mode)
+
+    def mkdir(self, path):
+        """Create a directory."""
+        os.mkdir(path)
+
+    def rmdir(self, path):
+        """Remove an empty directory."""
+        os.rmdir(path)
+
+    def remove(self, path):
+        """Remove a file."""
+        os.remove(path)
+
+    def rename(self, old_path, new_path):
+        """Rename a file or directory."""
+        os.rename(old_path, new_path)
+
+    def is_hidden(self, path):
+        """Whether a file is hidden."""
+        return is_hidden(path)
+
+    def get_short_pathname(self, path):
+        """Windows short path name, or None if not available."""
+        return get_short_pathname(path)
+
+    def get_free(self, path):
+        """Number of free bytes."""
+        return get_free_bytes(path)
+
+    def close(self):
+        """Release resources held by the file system."""
+
+
+##############################################################################
+# file systems not on the host
+
+def _oserror(err, path):
+    """Build an OS error for a path."""
+    return OSError(err, os.strerror(err), path)
+
+
+class VirtualFileSystem(object):
+    """Base class for file systems with paths that exist only in PC-BASIC."""
+
+    is_native = False
+
+    def _split(self, path):
+        """Split a path into its elements."""
+        return [_elem for _elem in self.abspath(path).split(os.sep) if _elem]
+
+    def abspath(self, path):
+        """Normalised absolute path."""
+        return os.path.normpath(os.path.join(os.sep, path))
+
+    def is_hidden(self, path):
+        """Whether a file is hidden."""
+        return False
+
+    def get_short_pathname(self, path):
+        """Windows short path name, or None if not available."""
+        return None
+
+    def close(self):
+        """Release resources held by the file system."""
+
+
+##############################################################################
+# RAM disk
+
+
+class _MemoryDirectory(object):
+    """Directory on a RAM disk."""
+
+    def __init__(self, mtime):
+        """Create an empty directory."""
+        self.entries = {}
+        self.mtime = mtime
+
+
+class _MemoryFile(object):
+    """File on a RAM disk."""
+
+    def __init__(self, mtime):
+        """Create an empty file."""
+        self.data = bytearray()
+        self.mtime = mtime
+        # removed files stay readable through open streams, but don't count towards quota
+        self.counted = True
+
+
+class MemoryFileSystem(VirtualFileSystem):
+    """File system held in memory, with an optional size quota."""
+
+    def __init__(self, quota=0):
+        """Create an empty RAM disk; quota 0 means no limit."""
+        self._quota = quota
+        self._used = 0
+        # change counter, used as modification time
+        self._changes = 0
+        self._root = _MemoryDirectory(0)
+
+    def _find(self, path):
+        """Get the node for a path, or None."""
+        node = self._root
+        for elem in self._split(path):
+            if not isinstance(node, _MemoryDirectory):
+                return None
+            node = node.entries.get(elem)
+            if node is None:
+                return None
+        return node
+
+    def _find_parent(self, path):
+        """Get the directory containing a path, and the path's last element."""
+        elements = self._split(path)
+        if not elements:
+            # the root has no parent
+            raise _oserror(errno.EBUSY, path)
+        parent = self._find(os.sep.join([u''] + elements[:-1]))
+        if parent is None:
+            raise _oserror(errno.ENOENT, path)
+        if not isinstance(parent, _MemoryDirectory):
+            raise _oserror(errno.ENOTDIR, path)
+        return parent, elements[-1]
+
+    def _touch(self, node):
+        """Update the modification time of a node."""
+        self._changes += 1
+        node.mtime = self._changes
+
+    def resize(self, node, length):
+        """Change the length of a file, within the quota."""
+        growth = length - len(node.data)
+        if node.counted:
+            if self._quota and growth > 0 and self._used + growth > self._quota:
+                raise IOError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+            self._used += growth
+        if growth < 0:
+            del node.data[length:]
+        else:
+            node.data.extend(b'\0' * growth)
+        self._touch(node)
+
+    def exists(self, path):
+        """Whether a path exists."""
+        return self._find(path) is not None
+
+    def isdir(self, path):
+        """Whether a path is a directory."""
+        return isinstance(self._find(path), _MemoryDirectory)
+
+    def isfile(self, path):
+        """Whether a path is a regular file."""
+        return isinstance(self._find(path), _MemoryFile)
+
+    def getmtime(self, path):
+        """Modification time of a path."""
+        node = self._find(path)
+        if node is None:
+            raise _oserror(errno.ENOENT, path)
+        return node.mtime
+
+    def listdir(self, path):
+        """Names in a directory."""
+        node = self._find(path)
+        if node is None:
+            raise _oserror(errno.ENOENT, path)
+        if not isinstance(node, _MemoryDirectory):
+            raise _oserror(errno.ENOTDIR, path)
+        return list(node.entries)
+
+    def open(self, path, mode):
+        """Open a binary stream with Python mode rb, wb, r+b or ab."""
+        parent, name = self._find_parent(path)
+        node = parent.entries.get(name)
+        if isinstance(node, _MemoryDirectory):
+            raise _oserror(errno.EISDIR, path)
+        if node is None:
+            if mode in ('rb', 'r+b'):
+                raise _oserror(errno.ENOENT, path)
+            node = parent.entries[name] = _MemoryFile(0)
+            self._touch(parent)
+        elif mode == 'wb':
+            self.resize(node, 0)
+        return MemoryStream(self, node, mode, path)
+
+    def mkdir(self, path):
+        """Create a directory."""
+        parent, name = self._find_parent(path)
+        if name in parent.entries:
+            raise _oserror(errno.EEXIST, path)
+        parent.entries[name] = _MemoryDirectory(0)
+        self._touch(parent.entries[name])
+        self._touch(parent)
+
+    def rmdir(self, path):
+        """Remove an empty directory."""
+        parent, name = self._find_parent(path)
+        node = parent.entries.get(name)
+        if node is None:
+            raise _oserror(errno.ENOENT, path)
+        if not isinstance(node, _MemoryDirectory):
+            raise _oserror(errno.ENOTDIR, path)
+        if node.entries:
+            raise _oserror(errno.ENOTEMPTY, path)
+        del parent.entries[name]
+        self._touch(parent)
+
+    def remove(self, path):
+        """Remove a file."""
+        parent, name = self._find_parent(path)
+        node = parent.entries.get(name)
+        if node is None:
+            raise _oserror(errno.ENOENT, path)
+        if isinstance(node, _MemoryDirectory):
+            raise _oserror(errno.EISDIR, path)
+        self._used -= len(node.data)
+        node.counted = False
+        del parent.entries[name]
+        self._touch(parent)
+
+    def rename(self, old_path, new_path):
+        """Rename a file or directory."""
+        old_parent, old_name = self._find_parent(old_path)
+        node = old_parent.entries.get(old_name)
+        if node is None:
+            raise _oserror(errno.ENOENT, old_path)
+        new_parent, new_name = self._find_parent(new_path)
+        if new_name in new_parent.entries:
+            raise _oserror(errno.EEXIST, new_path)
+        # don't move a directory into itself
+        if self._split(new_path)[:len(self._split(old_path))] == self._split(old_path):
+            raise _oserror(errno.EINVAL, new_path)
+        del old_parent.entries[old_name]
+        new_parent.entries[new_name] = node
+        self._touch(old_parent)
+        self._touch(new_parent)
+
+    def get_free(self, path):
+        """Number of free bytes."""
+        if self._quota:
+            return self._quota - self._used
+        return UNLIMITED_FREE
+
+
+##############################################################################
+# read-only archive
+
+class _ArchiveMember(object):
+    """Decompressed archive member, to be read through a MemoryStream."""
+
+    def __init__(self, data):
+        """Hold the member's contents."""
+        self.data = data
+
+
+class ArchiveFileSystem(VirtualFileSystem):
+    """Read-only file system on a zip or tar archive."""
+
+    def __init__(self, archive_path):
+        """Read the archive's index; raise if it's not a zip or tar file."""
+        self._archive_path = archive_path
+        self._archive = None
+        self._is_zip = zipfile.is_zipfile(archive_path)
+        # names in each directory, by tuple of path elements
+        self._dirs = {(): set()}
+        # archive member names, by tuple of path elements
+        self._members = {}
+        for name, isdir in self._list_members():
+            uni_name = name
+            if not isinstance(uni_name, unicode):
+                # zip names are cp437 unless flagged as utf-8, which zipfile decodes for us
+                uni_name = name.decode('cp437' if self._is_zip else 'utf-8', 'replace')
+            elements = tuple(
+                _elem for _elem in uni_name.replace(u'\\', u'/').split(u'/')
+                if _elem and _elem != u'.'
+            )
+            # don't allow members outside the archive root
+            if not elements or u'..' in elements:
+                continue
+            # add implicit parent directories
+            for i in range(len(elements)):
+                self._dirs.setdefault(elements[:i], set()).add(elements[i])
+            if isdir:
+                self._dirs.setdefault(elements, set())
+            else:
+                self._members[elements] = name
+        # decompressed member data, most recently used last
+        self._cache = OrderedDict()
+        self._cache_size = 0
+
+    def __getstate__(self):
+        """Pickle, without the open archive and the cache."""
+        pickle_dict = self.__dict__.copy()
+        pickle_dict['_archive'] = None
+        pickle_dict['_cache'] = OrderedDict()
+        pickle_dict['_cache_size'] = 0
+        return pickle_dict
+
+    def _open_archive(self):
+        """Open the archive, if it isn't open yet."""
+        if self._archive is None:
+            if self._is_zip:
+                self._archive = zipfile.ZipFile(self._archive_path)
+            else:
+                self._archive = tarfile.open(self._archive_path)
+        return self._archive
+
+    def _list_members(self):
+        """Get names of archive members and whether they are directories."""
+        archive = self._open_archive()
+        if self._is_zip:
+            return [(_info.filename, _info.filename.endswith('/')) for _info in archive.infolist()]
+        return [
+            (_info.name, _info.isdir()) for _info in archive.getmembers()
+            if _info.isdir() or _info.isfile()
+        ]
+
+    def _read_member(self, name):
+        """Decompress an archive member, using the cache."""
+        try:
+            # move to most-recently-used position
+            data = self._cache.pop(name)
+        except KeyError:
+            archive = self._open_archive()
+            if self._is_zip:
+                data = archive.read(name)
+            else:
+                data = archive.extractfile(name).read()
+            # don't keep members that are larger than the cache
+            if len(data) > ARCHIVE_CACHE_SIZE:
+                return data
+            self._cache_size += len(data)
+            while self._cache_size > ARCHIVE_CACHE_SIZE:
+                self._cache_size -= len(self._cache.popitem(last=False)[1])
+        self._cache[name] = data
+        return data
+
+    def exists(self, path):
+        """Whether a path exists."""
+        return self.isdir(path) or self.isfile(path)
+
+    def isdir(self, path):
+        """Whether a path is a directory."""
+        return tuple(self._split(path)) in self._dirs
+
+    def isfile(self, path):
+        """Whether a path is a regular file."""
+        return tuple(self._split(path)) in self._members
+
+    def getmtime(self, path):
+        """Modification time of a path; the archive doesn't change."""
+        if not self.exists(path):
+            raise _oserror(errno.ENOENT, path)
+        return 0
+
+    def listdir(self, path):
+        """Names in a directory."""
+        elements = tuple(self._split(path))
+        try:
+            return list(self._dirs[elements])
+        except KeyError:
+            if elements in self._members:
+                raise _oserror(errno.ENOTDIR, path)
+            raise _oserror(errno.ENOENT, path)
+
+    def open(self, path, mode):
+        """Open a binary stream; only reading is possible."""
+        elements = tuple(self._split(path))
+        if mode != 'rb':
+            raise _oserror(errno.EROFS, path)
+        if elements in self._dirs:
+            raise _oserror(errno.EISDIR, path)
+        try:
+            name = self._members[elements]
+        except KeyError:
+            raise _oserror(errno.ENOENT, path)
+        return MemoryStream(self, _ArchiveMember(self._read_member(name)), mode, path)
+
+    def mkdir(self, path):
+        """Can't create a directory."""
+        raise _oserror(errno.EROFS, path)
+
+    def rmdir(self, path):
+        """Can't remove a directory."""
+        raise _oserror(errno.EROFS, path)
+
+    def remove(self, path):
+        """Can't remove a file."""
+        raise _oserror(errno.EROFS, path)
+
+    def rename(self, old_path, new_path):
+        """Can't rename a file."""
+        raise _oserror(errno.EROFS, old_path)
+
+    def get_free(self, path):
+        """Number of free bytes."""
+        return 0
+
+    def close(self):
+        """Close the archive and drop the cache; the archive is reopened if needed."""
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+        self._cache = OrderedDict()
+        self._cache_size = 0
+
+
+##############################################################################
+# copy-on-write overlay
+
+# size of chunks to copy from the base to the overlay
+COPY_CHUNK_SIZE = 65536
+
+# file in the root of a host upper layer that keeps whiteouts and opaque directories between sessions
+OVERLAY_INDEX = u'.pcbasic-overlay'
+
+
+class OverlayFileSystem(VirtualFileSystem):
+    """Reads fall through to a shared base, changes go to an upper layer."""
+
+    def __init__(self, base, base_root, upper, upper_root):
+        """Stack an upper layer on a base; the base is never changed."""
+        self._base, self._base_root = base, base_root
+        self._upper, self._upper_root = upper, upper_root
+        # base entries that have been removed, by tuple of path elements
+        self._whiteouts = set()
+        # directories recreated in the upper layer, which hide the base's contents
+        self._opaque = set()
+        # change counter, part of the modification time
+        self._changes = 0
+        # a RAM disk upper layer doesn't outlive the session, so there is nothing to keep
+        self._index_path = None
+        if upper.is_native:
+            self._index_path = self._upper_path((OVERLAY_INDEX,))
+            self._load_index()
+
+    def _load_index(self):
+        """Read whiteouts and opaque directories kept by an earlier session."""
+        if not self._upper.isfile(self._index_path):
+            return
+        with self._upper.open(self._index_path, 'rb') as index:
+            for line in index.read().decode('utf-8').splitlines():
+                kind, _, path = line.partition(u' ')
+                elements = tuple(_elem for _elem in path.split(u'/') if _elem)
+                if kind == u'W':
+                    self._whiteouts.add(elements)
+                elif kind == u'O':
+                    self._opaque.add(elements)
+
+    def _save_index(self):
+        """Keep whiteouts and opaque directories on a host upper layer."""
+        if self._index_path is None:
+            return
+        lines = sorted(
+            [u'W /' + u'/'.join(_elem) for _elem in self._whiteouts]
+            + [u'O /' + u'/'.join(_elem) for _elem in self._opaque]
+        )
+        with self._upper.open(self._index_path, 'wb') as index:
+            index.write(u''.join(_line + u'\n' for _line in lines).encode('utf-8'))
+
+    def _is_index(self, elements):
+        """Whether a path is the upper layer's index file."""
+        return self._index_path is not None and elements == (OVERLAY_INDEX,)
+
+    def _base_path(self, elements):
+        """Path on the base layer."""
+        return os.path.join(self._base_root, *elements)
+
+    def _upper_path(self, elements):
+        """Path on the upper layer."""
+        return os.path.join(self._upper_root, *elements)
+
+    def _in_base(self, elements):
+        """Whether a path exists on the base layer and has not been removed or hidden."""
+        for i in range(len(elements)):
+            if elements[:i] in self._whiteouts or elements[:i] in self._opaque:
+                return False
+        return elements not in self._whiteouts and self._base.exists(self._base_path(elements))
+
+    def _locate(self, elements):
+        """Get the layer and layer path for a path, or None, None if it doesn't exist."""
+        upper_path = self._upper_path(elements)
+        if self._upper.exists(upper_path) and not self._is_index(elements):
+            return self._upper, upper_path
+        if self._in_base(elements):
+            return self._base, self._base_path(elements)
+        return None, None
+
+    def _isdir(self, elements):
+        """Whether a path is a directory."""
+        layer, layer_path = self._locate(elements)
+        return layer is not None and layer.isdir(layer_path)
+
+    def _listdir(self, elements):
+        """Names in a directory, merged from both layers."""
+        names = set()
+        upper_path = self._upper_path(elements)
+        if self._upper.isdir(upper_path):
+            names.update(
+                _name for _name in self._upper.listdir(upper_path)
+                if not self._is_index(elements + (_name,))
+            )
+        base_path = self._base_path(elements)
+        if elements not in self._opaque and self._in_base(elements) and self._base.isdir(base_path):
+            names.update(
+                _name for _name in self._base.listdir(base_path)
+                if elements + (_name,) not in self._whiteouts
+            )
+        return list(names)
+
+    def _check_parent(self, elements, path):
+        """Raise if the directory to hold a path doesn't exist."""
+        if not self._isdir(elements[:-1]):
+            raise _oserror(errno.ENOENT, path)
+
+    def _make_upper_dirs(self, elements):
+        """Create the directories holding a path on the upper layer."""
+        for i in range(1, len(elements)):
+            upper_path = self._upper_path(elements[:i])
+            if not self._upper.isdir(upper_path):
+                self._upper.mkdir(upper_path)
+
+    def _copy_up(self, elements):
+        """Copy a file, or what's missing of a directory tree, to the upper layer."""
+        upper_path = self._upper_path(elements)
+        self._make_upper_dirs(elements)
+        if self._isdir(elements):
+            # list before creating the upper directory, which would hide an opaque base
+            names = self._listdir(elements)
+            if not self._upper.isdir(upper_path):
+                self._upper.mkdir(upper_path)
+            for name in names:
+                self._copy_up(elements + (name,))
+        elif not self._upper.exists(upper_path):
+            source = self._base.open(self._base_path(elements), 'rb')
+            try:
+                target = self._upper.open(upper_path, 'wb')
+                try:
+                    while True:
+                        chunk = source.read(COPY_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        target.write(chunk)
+                finally:
+                    target.close()
+            finally:
+                source.close()
+
+    def _created(self, elements):
+        """Record that a path was created on the upper layer."""
+        if elements in self._whiteouts:
+            self._whiteouts.discard(elements)
+            # the base's old contents shouldn't show through the new file or directory
+            self._opaque.add(elements)
+            self._save_index()
+        self._changes += 1
+
+    def _removed(self, elements):
+        """Record that a path was removed from the upper layer, and hide it on the base."""
+        if self._in_base(elements):
+            self._whiteouts.add(elements)
+        if elements in self._whiteouts or elements in self._opaque:
+            self._opaque.discard(elements)
+            self._save_index()
+        self._changes += 1
+
+    def exists(self, path):
+        """Whether a path exists."""
+        return self._locate(tuple(self._split(path)))[0] is not None
+
+    def isdir(self, path):
+        """Whether a path is a directory."""
+        return self._isdir(tuple(self._split(path)))
+
+    def isfile(self, path):
+        """Whether a path is a regular file."""
+        layer, layer_path = self._locate(tuple(self._split(path)))
+        return layer is not None and layer.isfile(layer_path)
+
+    def getmtime(self, path):
+        """Modification time of a path, combined over the layers."""
+        elements = tuple(self._split(path))
+        if self._locate(elements)[0] is None:
+            raise _oserror(errno.ENOENT, path)
+        mtimes = [self._changes]
+        for layer, layer_path in (
+                (self._upper, self._upper_path(elements)), (self._base, self._base_path(elements))
+            ):
+            try:
+                mtimes.append(layer.getmtime(layer_path))
+            except EnvironmentError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def listdir(self, path):
+        """Names in a directory."""
+        elements = tuple(self._split(path))
+        layer, layer_path = self._locate(elements)
+        if layer is None:
+            raise _oserror(errno.ENOENT, path)
+        if not layer.isdir(layer_path):
+            raise _oserror(errno.ENOTDIR, path)
+        return self._listdir(elements)
+
+    def open(self, path, mode):
+        """Open a binary stream with Python mode rb, wb, r+b or ab."""
+        elements = tuple(self._split(path))
+        layer, layer_path = self._locate(elements)
+        if mode == 'rb' or layer is self._upper:
+            if layer is None:
+                raise _oserror(errno.ENOENT, path)
+            return layer.open(layer_path, mode)
+        if layer is None:
+            if mode == 'r+b':
+                raise _oserror(errno.ENOENT, path)
+            self._check_parent(elements, path)
+        elif layer.isdir(layer_path):
+            raise _oserror(errno.EISDIR, path)
+        elif mode != 'wb':
+            # copy on write; no need to copy what is truncated anyway
+            self._copy_up(elements)
+        self._make_upper_dirs(elements)
+        stream = self._upper.open(self._upper_path(elements), mode)
+        self._created(elements)
+        return stream
+
+    def mkdir(self, path):
+        """Create a directory."""
+        elements = tuple(self._split(path))
+        if self._locate(elements)[0] is not None:
+            raise _oserror(errno.EEXIST, path)
+        self._check_parent(elements, path)
+        self._make_upper_dirs(elements)
+        self._upper.mkdir(self._upper_path(elements))
+        self._created(elements)
+
+    def rmdir(self, path):
+        """Remove an empty directory."""
+        elements = tuple(self._split(path))
+        layer, layer_path = self._locate(elements)
+        if layer is None:
+            raise _oserror(errno.ENOENT, path)
+        if not elements:
+            raise _oserror(errno.EBUSY, path)
+        if not layer.isdir(layer_path):
+            raise _oserror(errno.ENOTDIR, path)
+        if self._listdir(elements):
+            raise _oserror(errno.ENOTEMPTY, path)
+        if layer is self._upper:
+            self._upper.rmdir(layer_path)
+        self._removed(elements)
+
+    def remove(self, path):
+        """Remove a file."""
+        elements = tuple(self._split(path))
+        layer, layer_path = self._locate(elements)
+        if layer is None:
+            raise _oserror(errno.ENOENT, path)
+        if layer.isdir(layer_path):
+            raise _oserror(errno.EISDIR, path)
+        if layer is self._upper:
+            self._upper.remove(layer_path)
+        self._removed(elements)
+
+    def rename(self, old_path, new_path):
+        """Rename a file or directory, copying it to the upper layer first."""
+        old_elements = tuple(self._split(old_path))
+        new_elements = tuple(self._split(new_path))
+        if self._locate(old_elements)[0] is None:
+            raise _oserror(errno.ENOENT, old_path)
+        if self._locate(new_elements)[0] is not None:
+            raise _oserror(errno.EEXIST, new_path)
+        self._check_parent(new_elements, new_path)
+        # don't move a directory into itself
+        if new_elements[:len(old_elements)] == old_elements:
+            raise _oserror(errno.EINVAL, new_path)
+        self._copy_up(old_elements)
+        self._make_upper_dirs(new_elements)
+        self._upper.rename(self._upper_path(old_elements), self._upper_path(new_elements))
+        self._removed(old_elements)
+        self._created(new_elements)
+
+    def is_hidden(self, path):
+        """Whether a file is hidden."""
+        layer, layer_path = self._locate(tuple(self._split(path)))
+        return layer is not None and layer.is_hidden(layer_path)
+
+    def get_free(self, path):
+        """Number of free bytes on the upper layer."""
+        return self._upper.get_free(self._upper_root)
+
+    def close(self):
+        """Release resources held by both layers."""
+        self._base.close()
+        self._upper.close()
+
+
+##############################################################################
+# stream on a file held in memory
+
+class MemoryStream(object):
+    """Stream on a file held in memory."""
+
+    def __init__(self, filesystem, node, mode, name):
+        """Open the stream."""
+        self._fs = filesystem
+        self._node = node
+        self.mode = mode
+        self.name = name
+        self.closed = False
+        self._pos = len(node.data) if mode == 'ab' else 0
+
+    def _check(self, writing):
+        """Raise if the stream can't be used for reading or writing."""
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+        if writing and self.mode == 'rb' or not writing and self.mode in ('wb', 'ab'):
+            raise IOError(errno.EBADF, os.strerror(errno.EBADF))
+
+    def read(self, n=-1):
+        """Read up to n bytes, or all remaining bytes if n is negative."""
+        self._check(writing=False)
+        start = self._pos
+        end = len(self._node.data) if n is None or n < 0 else start + n
+        data = bytes(self._node.data[start:end])
+        self._pos += len(data)
+        return data
+
+    def readinto(self, b):
+        """Read into a writeable buffer; return the number of bytes read."""
+        self._check(writing=False)
+        data = self._node.data[self._pos:self._pos+len(b)]
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def write(self, s):
+        """Write bytes at the current position."""
+        self._check(writing=True)
+        data = self._node.data
+        if self.mode == 'ab':
+            self._pos = len(data)
+        end = self._pos + len(s)
+        if end > len(data):
+            self._fs.resize(self._node, end)
+        data[self._pos:end] = s
+        self._pos = end
+        return len(s)
+
+    def seek(self, offset, whence=0):
+        """Move the stream position."""
+        if self.closed:
+            raise ValueError('I/O operation on closed file')
+        if whence == 1:
+            offset += self._pos
+        elif whence == 2:
+            offset += len(self._node.data)
+        if offset < 0:
+            raise IOError(errno.EINVAL, os.strerror(errno.EINVAL))
+        self._pos = offset
+        return offset
+
+    def tell(self):
+        """Get the stream position."""
+        return self._pos
+
+    def truncate(self, size=None):
+        """Set the length of the file."""
+        self._check(writing=True)
+        if size is None:
+            size = self._pos
+        self._fs.resize(self._node, size)
+        return size
+
+    def flush(self):
+        """Nothing to flush."""
+
+    def fileno(self):
+        """Memory streams have no file descriptor."""
+        raise io.UnsupportedOperation('fileno')
+
+    def close(self):
+        """Close the stream."""
+        self.closed = True
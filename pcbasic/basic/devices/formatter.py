@@ -6,6 +6,8 @@ Formatted output handling
 This file is released under the GNU GPL version 3 or later.
 """
 
+from collections import OrderedDict
+
 from ..base import codestream
 from ..base import error
 from ..base import tokens as tk
@@ -82,56 +84,85 @@ class Formatter(object):
         format_expr = values.next_string(args)
         if format_expr == b'':
             raise error.BASICError(error.IFC)
-        fors = codestream.CodeStream(format_expr)
+        fields, tail = _compile_format(format_expr)
         newline, format_chars = True, False
-        start_cycle = True
-        initial_literal = b''
         try:
-            while True:
-                c = fors.peek()
-                if c == b'':
-                    if not format_chars:
-                        # avoid infinite loop
-                        break
-                    # loop the format string if more variables to come
-                    start_cycle = True
-                    initial_literal = b''
-                    fors.seek(0)
-                elif c == b'_':
-                    # escape char; write next char in fors or _ if this is the last char
-                    if start_cycle:
-                        initial_literal += fors.read(2)[-1]
-                    else:
-                        self._output.write(fors.read(2)[-1])
-                else:
-                    try:
-                        format_field = StringField(fors)
-                    except ValueError:
-                        try:
-                            format_field = NumberField(fors)
-                        except ValueError:
-                            if start_cycle:
-                                initial_literal += fors.read(1)
-                            else:
-                                self._output.write(fors.read(1))
-                            continue
+            while fields:
+                for i, (literal, format_field) in enumerate(fields):
+                    if i:
+                        self._write_literal(literal)
                     value = next(args)
                     if value is None:
                         newline = False
                         break
-                    if start_cycle:
-                        self._output.write(initial_literal)
-                        start_cycle = False
+                    if not i:
+                        # the literal at the start of a cycle is only written if there's a value
+                        self._output.write(literal)
                         format_chars = True
                     self._output.write(format_field.format(value))
+                else:
+                    # loop the format string if more variables to come
+                    self._write_literal(tail)
+                    continue
+                break
         except StopIteration:
             pass
         if not format_chars:
-            self._output.write(initial_literal)
+            self._output.write(fields[0][0] if fields else tail)
             # there were no format chars in the string, illegal fn call
             raise error.BASICError(error.IFC)
         return newline
 
+    def _write_literal(self, literal):
+        """Write literal characters from a format string one at a time."""
+        for c in literal:
+            self._output.write(c)
+
+
+##############################################################################
+# format string compiler
+
+# number of compiled format strings to keep
+FORMAT_CACHE_SIZE = 64
+
+_format_cache = OrderedDict()
+
+def _compile_format(format_expr):
+    """Get list of (literal, field) pairs and the trailing literal for a format string."""
+    try:
+        # move to most-recently-used position
+        compiled = _format_cache.pop(format_expr)
+    except KeyError:
+        compiled = _parse_format(format_expr)
+        if len(_format_cache) >= FORMAT_CACHE_SIZE:
+            _format_cache.popitem(last=False)
+    _format_cache[format_expr] = compiled
+    return compiled
+
+def _parse_format(format_expr):
+    """Parse a format string into a list of (literal, field) pairs and the trailing literal."""
+    fors = codestream.CodeStream(format_expr)
+    fields, literal = [], b''
+    while True:
+        c = fors.peek()
+        if c == b'':
+            break
+        elif c == b'_':
+            # escape char; take next char in fors or _ if this is the last char
+            literal += fors.read(2)[-1]
+        else:
+            try:
+                format_field = StringField(fors)
+            except ValueError:
+                try:
+                    format_field = NumberField(fors)
+                except ValueError:
+                    literal += fors.read(1)
+                    continue
+            fields.append((literal, format_field))
+            literal = b''
+    return fields, literal
+
 
 ##############################################################################
 # formatting functions and format string parsers
@@ -10,6 +10,9 @@ import logging
 import sys
 import os
 import io
+import re
+import threading
+import Queue
 
 try:
     import parallel
@@ -25,6 +28,9 @@ from .devicebase import Device, DeviceSettings, TextFileBase, parse_protocol_str
 # flush triggers
 TRIGGERS = {'page': b'\f', 'line': b'\n', 'close': None, '': None}
 
+# maximum number of print jobs waiting to be printed
+SPOOL_QUEUE_SIZE = 16
+
 
 ###############################################################################
 # LPT ports
@@ -81,6 +87,11 @@ class LPTDevice(Device):
         """Device is available."""
         return self.stream is not None
 
+    def close(self):
+        """Close the device and wait for spooled print jobs."""
+        Device.close(self)
+        _spooler.drain()
+
 
 ###############################################################################
 # file on LPT device
@@ -172,6 +183,11 @@ class PrinterStream(io.BytesIO):
         self.codepage = codepage
         # flush_trigger can be a char or a code word
         self._flush_trigger = TRIGGERS.get(flush_trigger.lower(), flush_trigger)
+        # split written strings at backspaces and the flush trigger
+        specials = b'\b'
+        if self._flush_trigger and len(self._flush_trigger) == 1:
+            specials += self._flush_trigger.encode('latin-1', 'ignore')
+        self._splitter = re.compile(b'([%s])' % re.escape(specials))
         io.BytesIO.__init__(self)
 
     def close(self):
@@ -180,15 +196,16 @@ class PrinterStream(io.BytesIO):
 
     def write(self, s):
         """Write to printer stream."""
-        for c in s:
-            if c == b'\b':
+        for i, chunk in enumerate(self._splitter.split(bytes(s))):
+            # odd-numbered parts are the separators
+            if i % 2 and chunk == b'\b':
                 # backspace: drop a non-newline character from the buffer
                 self.seek(-1, 1)
                 if self.read(1) not in (b'\r', b'\n', b'\f'):
                     self.seek(-1, 1)
                     self.truncate()
-            io.BytesIO.write(self, c)
-            if c == self._flush_trigger:
+            io.BytesIO.write(self, chunk)
+            if i % 2 and chunk == self._flush_trigger:
                 self.flush()
 
     def flush(self):
@@ -201,7 +218,7 @@ class PrinterStream(io.BytesIO):
         # any naked lead bytes in DBCS will remain just that - avoid in-line flushes.
         utf8buf = self.codepage.str_to_unicode(
                     printbuf, preserve=CONTROL).encode('utf-8', 'replace')
-        line_print(utf8buf, self.printer_name)
+        _spooler.submit(utf8buf, self.printer_name)
 
     def set_control(self, select=False, init=False, lf=False, strobe=False):
         """Set the values of the control pins."""
@@ -211,6 +228,52 @@ class PrinterStream(io.BytesIO):
         return False, False, False, False, False
 
 
+##############################################################################
+# print spooler
+
+class PrintSpooler(object):
+    """Run print jobs on a background thread so that the interpreter doesn't wait."""
+
+    def __init__(self, queue_size=SPOOL_QUEUE_SIZE):
+        """Set up the job queue; the worker thread starts when needed."""
+        self._queue = Queue.Queue(queue_size)
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def submit(self, printbuf, printer_name):
+        """Queue a print job; blocks while the queue is full."""
+        self._queue.put((printbuf, printer_name))
+        with self._lock:
+            if self._worker is None:
+                # not a daemon thread, so we don't lose jobs submitted just before exit
+                self._worker = threading.Thread(target=self._work)
+                self._worker.start()
+
+    def _work(self):
+        """Print jobs until the queue is empty."""
+        while True:
+            with self._lock:
+                try:
+                    printbuf, printer_name = self._queue.get_nowait()
+                except Queue.Empty:
+                    self._worker = None
+                    return
+            try:
+                line_print(printbuf, printer_name)
+            except Exception as e:
+                logging.error(u'Error while printing to %s: %s', printer_name, e)
+            finally:
+                self._queue.task_done()
+
+    def drain(self):
+        """Wait until all queued jobs have been handed to the printer."""
+        self._queue.join()
+
+
+# print jobs from all printer streams go through the same queue
+_spooler = PrintSpooler()
+
+
 ##############################################################################
 # physical parallel ports
 
@@ -11,6 +11,9 @@ import sys
 import os
 import datetime
 import io
+import time
+import threading
+import weakref
 from contextlib import contextmanager
 
 from ...compat import key_pressed
@@ -152,6 +155,8 @@ class COMDevice(Device):
         """Whether a char is present in buffer. For ON COM(n)."""
         if not self._serial:
             return False
+        if self._file and self._file.is_open and self._file.buffered():
+            return True
         with safe_io():
             # ON COM can be set without any OPEN statement
             # so we need to ensure the serial port is opened before querying it
@@ -169,6 +174,13 @@ class COMDevice(Device):
                 pass
             elif addr == u'STDIO' or (not addr and val.upper() == u'STDIO'):
                 return SerialStdIO(val.upper() == u'CRLF')
+            elif addr in (u'PIPE', u'LOOP') or (not addr and val.upper() == u'LOOP'):
+                if addr == u'PIPE':
+                    stream = open_serial_pipe(val)
+                else:
+                    stream = SerialPipe(u'LOOP', loopback=True).claim()
+                stream.timeout = self._queues.tick
+                return stream
             else:
                 if not serial:
                     logging.warning(
@@ -180,13 +192,18 @@ class COMDevice(Device):
                     # throws ValueError if too many :s, caught below
                     host, socket = val.split(u':')
                     url = u'%s://%s:%s' % (addr.lower(), host, socket)
-                    stream = serial.serial_for_url(url, timeout=0, do_not_open=True)
+                    stream = serial.serial_for_url(
+                        url, timeout=self._queues.tick, do_not_open=True
+                    )
                     # monkey-patch serial object as SocketSerial does not have this property
                     stream.out_waiting = 0
                     return stream
                 elif addr == u'PORT':
                     # port can be e.g. /dev/ttyS1 on Linux or COM1 on Windows.
-                    return serial.serial_for_url(val, timeout=0, do_not_open=True)
+                    # reads block for at most one event tick while nothing is waiting
+                    return serial.serial_for_url(
+                        val, timeout=self._queues.tick, do_not_open=True
+                    )
                 else:
                     raise ValueError(u'Invalid protocol `%s`' % (addr,))
         except (ValueError, EnvironmentError) as e:
@@ -205,6 +222,9 @@ class COMDevice(Device):
         """Initialise stream from pickling dict."""
         self.__dict__.update(pickle_dict)
         self._serial = self._init_serial(self._spec)
+        # an open file still holds the stream we had before pickling
+        if self._file and self._serial:
+            self._file._fhandle = self._serial
 
     def _check_open(self):
         """Open the underlying port if necessary."""
@@ -299,7 +319,10 @@ class COMDevice(Device):
         with safe_io(error.DEVICE_FAULT):
             self._check_open()
             # socketserial has no out_waiting, though Serial does
-            return self._serial.in_waiting > 0, self._serial.out_waiting > 0
+            in_waiting = self._serial.in_waiting
+            if self._file and self._file.is_open:
+                in_waiting += self._file.buffered()
+            return in_waiting > 0, self._serial.out_waiting > 0
 
 
 ###############################################################################
@@ -328,17 +351,39 @@ class COMFile(TextFileBase, RealTimeInputMixin):
         """Return only readahead buffer, no blocking peek."""
         return b''.join(self._readahead[:num])
 
+    def buffered(self):
+        """Number of bytes taken off the port but not yet read."""
+        return len(self._readahead)
+
+    def _fill(self):
+        """Move all bytes waiting on the port into the readahead buffer; False if none came."""
+        with safe_io():
+            waiting = min(self._fhandle.in_waiting, self._serial_in_size)
+            # drain the port in one call; if nothing is waiting,
+            # wait for a byte for at most the port's read timeout
+            chunk = self._fhandle.read(waiting or 1)
+        self._readahead.extend(chunk)
+        return bool(chunk)
+
     def read(self, num):
         """Read a number of characters."""
-        # take at most num chars out of readahead buffer (holds just one on COM but anyway)
-        s, self._readahead = self._readahead[:num], self._readahead[num:]
+        s = self._readahead[:num]
+        del self._readahead[:num]
         while len(s) < num:
-            self._queues.wait()
-            with safe_io():
-                # non-blocking read
-                self._current, self._previous = self._fhandle.read(1), self._current
-            if self._current:
-                s.append(self._current)
+            if not self._fill():
+                # starved: let events through while we wait
+                if self._fhandle.timeout:
+                    # the read has already blocked for a tick
+                    self._queues.check_events()
+                else:
+                    self._queues.wait()
+            chunk = self._readahead[:num-len(s)]
+            del self._readahead[:len(chunk)]
+            s.extend(chunk)
+        if len(s) > 1:
+            self._previous, self._current = s[-2], s[-1]
+        elif s:
+            self._previous, self._current = self._current, s[0]
         logging.debug('Reading from serial port %s: %r', self._fhandle.port, b''.join(s))
         return b''.join(s)
 
@@ -367,7 +412,7 @@ class COMFile(TextFileBase, RealTimeInputMixin):
         """Write string or bytearray and newline to port."""
         self.write(s + b'\r')
 
-    def write(self, s):
+    def write(self, s, can_break=True):
         """Write string to port."""
         if self._linefeed:
             s = s.replace(b'\r', b'\r\n')
@@ -392,7 +437,7 @@ class COMFile(TextFileBase, RealTimeInputMixin):
     def loc(self):
         """LOC: Returns number of chars waiting to be read."""
         with safe_io():
-            return self._fhandle.in_waiting
+            return self.buffered() + self._fhandle.in_waiting
 
     def eof(self):
         """EOF: no chars waiting."""
@@ -401,8 +446,7 @@ class COMFile(TextFileBase, RealTimeInputMixin):
 
     def lof(self):
         """Returns number of bytes free in buffer."""
-        with safe_io():
-            return max(0, self._serial_in_size - self._fhandle.in_waiting)
+        return max(0, self._serial_in_size - self.loc())
 
 
 ###############################################################################
@@ -430,6 +474,8 @@ class SerialStdIO(object):
         self.dtr = False
         self.break_condition = False
         self.port = u'STDIO'
+        # reads don't block
+        self.timeout = 0
 
     def open(self):
         """Open a connection."""
@@ -466,3 +512,174 @@ class SerialStdIO(object):
         return key_pressed()
 
     out_waiting = 0
+
+
+###############################################################################
+# in-process serial connections
+
+# capacity of each direction of a serial pipe, in bytes
+PIPE_BUFFER_SIZE = 65536
+
+# named pipes with at least one end in use
+_pipes = weakref.WeakValueDictionary()
+_pipes_lock = threading.Lock()
+
+
+def open_serial_pipe(name):
+    """Claim a free end of the named in-process serial pipe, creating the pipe if needed."""
+    with _pipes_lock:
+        pipe = _pipes.get(name)
+        if pipe is None:
+            pipe = _pipes[name] = SerialPipe(name)
+        return pipe.claim()
+
+
+class RingBuffer(object):
+    """Fixed-size byte queue that can be shared between threads."""
+
+    def __init__(self, size):
+        """Create an empty buffer."""
+        self._data = bytearray(size)
+        self._start = 0
+        self._count = 0
+        self._ready = threading.Condition()
+
+    def __len__(self):
+        """Number of bytes waiting."""
+        return self._count
+
+    def write(self, s):
+        """Append bytes; those that don't fit are dropped. Return number written."""
+        with self._ready:
+            size = len(self._data)
+            num = min(len(s), size - self._count)
+            end = (self._start + self._count) % size
+            first = min(num, size - end)
+            self._data[end:end+first] = s[:first]
+            self._data[:num-first] = s[first:num]
+            self._count += num
+            if num:
+                self._ready.notify_all()
+        return num
+
+    def read(self, num, timeout=0):
+        """Take up to num bytes, waiting at most timeout seconds for all to arrive."""
+        with self._ready:
+            if self._count < num and timeout:
+                deadline = time.time() + timeout
+                while self._count < num:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._ready.wait(remaining)
+            num = min(num, self._count)
+            size = len(self._data)
+            first = min(num, size - self._start)
+            out = bytes(self._data[self._start:self._start+first] + self._data[:num-first])
+            self._start = (self._start + num) % size
+            self._count -= num
+        return out
+
+
+class SerialPipe(object):
+    """Two-way connection between serial endpoints in the same process."""
+
+    def __init__(self, name, loopback=False):
+        """Create the pipe; a loopback pipe has a single end that reads what it writes."""
+        self.name = name
+        self.loopback = loopback
+        forward = RingBuffer(PIPE_BUFFER_SIZE)
+        backward = forward if loopback else RingBuffer(PIPE_BUFFER_SIZE)
+        # input and output buffer for each end
+        self._buffers = ((backward, forward), (forward, backward))
+        # weak references to the claimed ends
+        self._ends = [None, None]
+
+    def claim(self):
+        """Get a free end of the pipe."""
+        for index in range(1 if self.loopback else 2):
+            if self._ends[index] is None or self._ends[index]() is None:
+                end = SerialPipeEnd(self, index, *self._buffers[index])
+                self._ends[index] = weakref.ref(end)
+                return end
+        raise ValueError(u'Serial pipe `%s` has no free end' % (self.name,))
+
+    def peer(self, index):
+        """Get the end connected to the given one, if it has been claimed."""
+        other = self._ends[index if self.loopback else 1 - index]
+        return other() if other is not None else None
+
+
+class SerialPipeEnd(object):
+    """End of a serial pipe, usable in place of a serial port object."""
+
+    # dummy input pins
+    cd = True
+    ri = False
+    dsr = True
+    cts = True
+
+    out_waiting = 0
+
+    def __init__(self, pipe, index, inbox, outbox):
+        """Initialise the endpoint."""
+        # keep the pipe alive while we are
+        self._pipe = pipe
+        self._index = index
+        self._inbox = inbox
+        self._outbox = outbox
+        self._callback = None
+        self.is_open = False
+        self.port = pipe.name
+        # seconds that read() waits for data; 0 means don't block
+        self.timeout = 0
+        # dummy parameters
+        self.baudrate = 300
+        self.parity = b'E'
+        self.bytesize = 8
+        self.stopbits = 2
+        # dummy output pins
+        self.rts = False
+        self.dtr = False
+        self.break_condition = False
+
+    def __getstate__(self):
+        """Get pickling dict for stream; the connection can't be kept."""
+        return {'name': self._pipe.name, 'loopback': self._pipe.loopback}
+
+    def __setstate__(self, st):
+        """Initialise stream from pickling dict, on a pipe of its own."""
+        # the COM device reconnects and replaces this stream
+        self.__dict__.update(SerialPipe(st['name'], st['loopback']).claim().__dict__)
+
+    def open(self):
+        """Open a connection."""
+        self.is_open = True
+
+    def close(self):
+        """Close the connection."""
+        self.is_open = False
+
+    def set_callback(self, callback):
+        """Pass bytes sent to this end to callback(bytes); whatever it returns is sent back."""
+        self._callback = callback
+
+    def read(self, num=1):
+        """Read up to num bytes, waiting at most the timeout for them."""
+        return self._inbox.read(num, self.timeout)
+
+    def write(self, s):
+        """Send bytes to the other end."""
+        peer = self._pipe.peer(self._index)
+        if peer is not None and peer._callback is not None:
+            reply = peer._callback(bytes(s))
+            if reply:
+                peer.write(reply)
+        elif self._outbox.write(s) < len(s):
+            logging.warning(u'Serial pipe `%s` overflow: data lost.', self.port)
+        return len(s)
+
+    @property
+    def in_waiting(self):
+        """Number of bytes waiting to be read."""
+        return len(self._inbox)
@@ -47,8 +47,9 @@ class Palette(object):
         self.rgb_palette[index] = mode.colours[colour]
         if mode.colours1:
             self.rgb_palette1[index] = mode.colours1[colour]
-        self._queues.video.put(
-            signals.Event(signals.VIDEO_SET_PALETTE, (self.rgb_palette, self.rgb_palette1)))
+        if not self._queues.headless:
+            self._queues.video.put(
+                signals.Event(signals.VIDEO_SET_PALETTE, (self.rgb_palette, self.rgb_palette1)))
 
     def get_entry(self, index):
         """Retrieve the colour for a given attribute."""
@@ -64,8 +65,9 @@ class Palette(object):
             self.rgb_palette1 = [self.mode.colours1[i] for i in self.palette]
         else:
             self.rgb_palette1 = None
-        self._queues.video.put(
-            signals.Event(signals.VIDEO_SET_PALETTE, (self.rgb_palette, self.rgb_palette1)))
+        if not self._queues.headless:
+            self._queues.video.put(
+                signals.Event(signals.VIDEO_SET_PALETTE, (self.rgb_palette, self.rgb_palette1)))
 
     def mode_allows_palette(self, mode):
         """Check if the video mode allows palette change."""
@@ -237,7 +237,7 @@ class GlyphCache(object):
 
     def submit(self):
         """Send glyph dict to interface."""
-        if self._mode.is_text_mode:
+        if self._mode.is_text_mode and not self._queues.headless:
             # send glyphs to signals; copy is necessary
             # as dict may change here while the other thread is working on it
             self._queues.video.put(signals.Event(
@@ -259,7 +259,7 @@ class GlyphCache(object):
             char, self._mode.font_width*2, self._mode.font_height
         )
         self._glyphs[char] = mask
-        if self._mode.is_text_mode:
+        if self._mode.is_text_mode and not self._queues.headless:
             self._queues.video.put(signals.Event(
                 signals.VIDEO_BUILD_GLYPHS, ({self._codepage.to_unicode(char, u'\0'): mask},)
             ))
@@ -169,6 +169,8 @@ class Drawing(object):
         # use attr = 0 ?
         if col >= 1 and row >= 1 and col <= self._mode.width and row <= self._mode.height:
             self._text.put_char_attr(self._apagenum, row, col, b' ', self._attr)
+        if self._queues.headless:
+            return
         fore, back, blink, underline = self._mode.split_attr(self._attr)
         self._queues.video.put(
             signals.Event(signals.VIDEO_PUT_GLYPH,
@@ -189,7 +191,10 @@ class Drawing(object):
             pagenum = self._apagenum
         if self.graph_view.contains(x, y):
             self._pixels.pages[pagenum].put_pixel(x, y, index)
-            self._queues.video.put(signals.Event(signals.VIDEO_PUT_PIXEL, (pagenum, x, y, index)))
+            if not self._queues.headless:
+                self._queues.video.put(
+                    signals.Event(signals.VIDEO_PUT_PIXEL, (pagenum, x, y, index))
+                )
             self.clear_text_at(x, y)
 
     def get_pixel(self, x, y, pagenum=None):
@@ -206,18 +211,20 @@ class Drawing(object):
         """Write a list of attributes to a scanline interval."""
         x, y, colours = self.graph_view.clip_list(x, y, colours)
         newcolours = self._pixels.pages[pagenum].put_interval(x, y, colours, mask)
-        self._queues.video.put(
-            signals.Event(signals.VIDEO_PUT_INTERVAL, (pagenum, x, y, newcolours))
-        )
+        if not self._queues.headless:
+            self._queues.video.put(
+                signals.Event(signals.VIDEO_PUT_INTERVAL, (pagenum, x, y, newcolours))
+            )
         self.clear_text_area(x, y, x+len(colours), y)
 
     def fill_interval(self, x0, x1, y, index):
         """Fill a scanline interval in a solid attribute."""
         x0, x1, y = self.graph_view.clip_interval(x0, x1, y)
         self._pixels.pages[self._apagenum].fill_interval(x0, x1, y, index)
-        self._queues.video.put(
-            signals.Event(signals.VIDEO_FILL_INTERVAL, (self._apagenum, x0, x1, y, index))
-        )
+        if not self._queues.headless:
+            self._queues.video.put(
+                signals.Event(signals.VIDEO_FILL_INTERVAL, (self._apagenum, x0, x1, y, index))
+            )
         self.clear_text_area(x0, y, x1, y)
 
     def get_until(self, x0, x1, y, c):
@@ -234,18 +241,20 @@ class Drawing(object):
         rect = self._pixels.pages[self._apagenum].put_rect(
             x0, y0, x1, y1, sprite, operation_token
         )
-        self._queues.video.put(
-            signals.Event(signals.VIDEO_PUT_RECT, (self._apagenum, x0, y0, x1, y1, rect))
-        )
+        if not self._queues.headless:
+            self._queues.video.put(
+                signals.Event(signals.VIDEO_PUT_RECT, (self._apagenum, x0, y0, x1, y1, rect))
+            )
         self.clear_text_area(x0, y0, x1, y1)
 
     def fill_rect(self, x0, y0, x1, y1, index):
         """Fill a rectangle in a solid attribute."""
         x0, y0, x1, y1 = self.graph_view.clip_rect(x0, y0, x1, y1)
         self._pixels.pages[self._apagenum].fill_rect(x0, y0, x1, y1, index)
-        self._queues.video.put(
-            signals.Event(signals.VIDEO_FILL_RECT, (self._apagenum, x0, y0, x1, y1, index))
-        )
+        if not self._queues.headless:
+            self._queues.video.put(
+                signals.Event(signals.VIDEO_FILL_RECT, (self._apagenum, x0, y0, x1, y1, index))
+            )
         self.clear_text_area(x0, y0, x1, y1)
 
     ## VIEW graphics viewport
@@ -9,66 +9,214 @@ This file is released under the GNU GPL version 3 or later.
 import logging
 
 
+# converter state at the start of a row
+START_STATE = (b'', -1, b'')
+
+
+def _dbcs_flags(sequences):
+    """Convert marked code sequences to DBCS flags."""
+    return [flag for seq in sequences for flag in ((0,) if len(seq) == 1 else (1, 2))]
+
+
 class TextRow(object):
-    """Buffer for a single row of the screen."""
+    """Line-structure information for a single row of the screen."""
 
-    def __init__(self, attr, width, conv, dbcs_enabled):
+    def __init__(self):
         """Set up screen row empty and unwrapped."""
-        self.width = width
-        self.clear(attr)
         # line continues on next row (either LF or word wrap happened)
         self.wrap = False
+        # last non-whitespace character
+        self.end = 0
+        # converter state after each column, for incremental DBCS marking; None if out of date
+        self.dbcs_states = None
+
+
+class TextPage(object):
+    """Buffer for a screen page, with character, attribute and DBCS planes."""
+
+    def __init__(self, attr, width, height, conv, dbcs_enabled):
+        """Initialise the screen buffer to given dimensions."""
+        self.row = [TextRow() for _ in xrange(height)]
+        self.width = width
+        self.height = height
+        # planes are row-major, initialised to spaces
+        self.chars = bytearray(b' ') * (width * height)
+        self.attrs = bytearray([attr]) * (width * height)
+        # character is part of double width char; 0 = no; 1 = lead, 2 = trail
+        self.double = bytearray(width * height)
         self._dbcs_enabled = dbcs_enabled
         self._conv = conv
 
-    def clear(self, attr):
-        """Clear the screen row buffer. Leave wrap untouched."""
-        # screen buffer, initialised to spaces
-        self.buf = [(b' ', attr)] * self.width
-        # character is part of double width char; 0 = no; 1 = lead, 2 = trail
-        self.double = [0] * self.width
-        # last non-whitespace character
-        self.end = 0
+    def index(self, row, col):
+        """Position in the planes, wrapping negative indices like a list of rows would."""
+        if 0 < row <= self.height and 0 < col <= self.width:
+            return (row-1) * self.width + col-1
+        row, col = row-1, col-1
+        if row < 0:
+            row += self.height
+        if col < 0:
+            col += self.width
+        if not (0 <= row < self.height and 0 <= col < self.width):
+            raise IndexError('text position out of range')
+        return row * self.width + col
 
-    def clear_from(self, scol, attr):
-        """Clear characters from given position till end of row."""
-        self.buf = self.buf[:scol-1] + [(b' ', attr)] * (self.width - scol + 1)
-        self.double = self.double[:scol-1] + [0] * (self.width - scol + 1)
-        self.end = min(self.end, scol-1)
+    def get_row_chars(self, row):
+        """Retrieve the bytes on a row."""
+        offset = (row-1) * self.width
+        return bytes(self.chars[offset:offset+self.width])
+
+    def clear_from(self, row, col, attr):
+        """Clear characters from given position till end of row. Leave wrap untouched."""
+        start, stop = (row-1) * self.width + col-1, row * self.width
+        self.chars[start:stop] = b' ' * (stop - start)
+        self.attrs[start:stop] = bytearray([attr]) * (stop - start)
+        self.double[start:stop] = bytearray(stop - start)
+        therow = self.row[row-1]
+        therow.end = min(therow.end, col-1)
+        therow.dbcs_states = None
+
+    def clear_rows(self, start, stop, attr):
+        """Clear the given (inclusive) range of rows. Leave wrap untouched."""
+        start, stop = (start-1) * self.width, stop * self.width
+        self.chars[start:stop] = b' ' * (stop - start)
+        self.attrs[start:stop] = bytearray([attr]) * (stop - start)
+        self.double[start:stop] = bytearray(stop - start)
+        for therow in self.row[start//self.width:stop//self.width]:
+            therow.end = 0
+            therow.dbcs_states = None
 
-    def put_char_attr(self, col, c, attr):
+    def clear_area(self, row0, col0, row1, col1, attr):
+        """Clear a rectangular area of the page, leaving the DBCS plane and line ends."""
+        length = max(0, col1 - col0 + 1)
+        for offset in range((row0-1) * self.width, row1 * self.width, self.width):
+            self.chars[offset+col0-1:offset+col1] = b' ' * length
+            self.attrs[offset+col0-1:offset+col1] = bytearray([attr]) * length
+        for therow in self.row[row0-1:row1]:
+            therow.dbcs_states = None
+
+    def put_char_attr(self, row, col, c, attr):
         """Put a byte to the screen, reinterpreting SBCS and DBCS as necessary."""
         # update the screen buffer
-        self.buf[col-1] = (c, attr)
-        self.double[col-1] = 0
+        index = self.index(row, col)
+        self.chars[index] = ord(c)
+        self.attrs[index] = attr
+        old_flag, self.double[index] = self.double[index], 0
         # for sbcs codepages we're done now
         if not self._dbcs_enabled:
             return col, col
         # mark out replaced char and changed following dbcs characters to be redrawn
-        sequences = self._conv.mark(b''.join(entry[0] for entry in self.buf), flush=True)
-        flags = ((0,) if len(seq) == 1 else (1, 2) for seq in sequences)
-        old_double = self.double
-        self.double = [entry for flag in flags for entry in flag]
+        offset = index - index % self.width
+        therow = self.row[row-1]
+        if therow.dbcs_states is None:
+            first, last = self._mark_row(offset, therow)
+        else:
+            first, last = self._mark_from(offset, therow, index - offset, old_flag)
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                # consistency check against a full pass over the row
+                double = self.double[offset:offset+self.width]
+                self._mark_row(offset, therow)
+                if double != self.double[offset:offset+self.width]:
+                    logging.debug('Incremental DBCS marking inconsistent on row %d', row)
         # find the first and last changed columns, to be able to redraw
-        diff = [old != new for old, new in zip(old_double, self.double)]
-        if True in diff:
-            start, stop = diff.index(True) + 1, len(diff) - diff[::-1].index(True)
+        if first is not None:
+            start, stop = first + 1, last + 1
         else:
             start, stop = col, col
         # if the tail byte has changed, the lead byte needs to be redrawn as well
-        if self.double[start-1] == 2:
+        if self.double[offset+start-1] == 2:
             start -= 1
         return min(col, start), max(col, stop)
 
+    def _mark_row(self, offset, therow):
+        """Mark DBCS lead and trail bytes on a row; return first and last changed column index."""
+        old_double = self.double[offset:offset+self.width]
+        self._conv.set_state(START_STATE)
+        therow.dbcs_states = []
+        flags = []
+        for c in bytes(self.chars[offset:offset+self.width]):
+            flags += _dbcs_flags(self._conv.mark(c))
+            therow.dbcs_states.append(self._conv.get_state())
+        flags += _dbcs_flags(self._conv.mark(b'', flush=True))
+        self.double[offset:offset+self.width] = bytearray(flags)
+        diff = [i for i, (old, new) in enumerate(zip(old_double, flags)) if old != new]
+        if not diff:
+            return None, None
+        return diff[0], diff[-1]
 
-class TextPage(object):
-    """Buffer for a screen page."""
+    def _mark_from(self, offset, therow, changed, changed_flag):
+        """Re-mark DBCS bytes from a changed column index until the converter state resynchronises."""
+        states = therow.dbcs_states
+        state = states[changed-1] if changed else START_STATE
+        self._conv.set_state(state)
+        # bytes held in the converter buffer have not been marked yet
+        start = changed - len(state[0])
+        flags = []
+        for i in xrange(changed, self.width):
+            flags += _dbcs_flags(self._conv.mark(chr(self.chars[offset+i])))
+            new_state = self._conv.get_state()
+            if new_state == states[i]:
+                # the rest of the row, including buffered bytes, is marked as before
+                break
+            states[i] = new_state
+        else:
+            flags += _dbcs_flags(self._conv.mark(b'', flush=True))
+        old_double = self.double[offset+start:offset+start+len(flags)]
+        self.double[offset+start:offset+start+len(flags)] = bytearray(flags)
+        diff = [start + i for i, (old, new) in enumerate(zip(old_double, flags)) if old != new]
+        if start + len(flags) <= changed:
+            # the changed byte is still buffered, so it is marked as before it was cleared
+            self.double[offset+changed] = changed_flag
+            if changed_flag:
+                diff.append(changed)
+        if not diff:
+            return None, None
+        return diff[0], diff[-1]
 
-    def __init__(self, attr, width, height, conv, dbcs_enabled):
-        """Initialise the screen buffer to given dimensions."""
-        self.row = [TextRow(attr, width, conv, dbcs_enabled) for _ in xrange(height)]
-        self.width = width
-        self.height = height
+    def put_chars_attr(self, row, col, s, attr):
+        """Put a run of single-byte characters on a row, for sbcs only. Return last column."""
+        start = (row-1) * self.width + col-1
+        self.chars[start:start+len(s)] = s
+        self.attrs[start:start+len(s)] = bytearray([attr]) * len(s)
+        self.double[start:start+len(s)] = bytearray(len(s))
+        self.row[row-1].dbcs_states = None
+        return col + len(s) - 1
+
+    def insert_char_attr(self, row, col, c, attr):
+        """Insert a byte, shifting the rest of the row right; return the byte pushed off the end."""
+        start, stop = (row-1) * self.width + col-1, row * self.width
+        last = chr(self.chars[stop-1]), self.attrs[stop-1]
+        self.chars[start+1:stop] = self.chars[start:stop-1]
+        self.attrs[start+1:stop] = self.attrs[start:stop-1]
+        self.chars[start] = ord(c)
+        self.attrs[start] = attr
+        self.row[row-1].dbcs_states = None
+        return last
+
+    def _insert_row(self, index, attr):
+        """Insert a blank row in the planes and row list."""
+        offset = index * self.width
+        self.row.insert(index, TextRow())
+        self.chars[offset:offset] = b' ' * self.width
+        self.attrs[offset:offset] = bytearray([attr]) * self.width
+        self.double[offset:offset] = bytearray(self.width)
+
+    def _delete_row(self, index):
+        """Delete a row from the planes and row list."""
+        offset = index * self.width
+        del self.row[index]
+        del self.chars[offset:offset+self.width]
+        del self.attrs[offset:offset+self.width]
+        del self.double[offset:offset+self.width]
+
+    def scroll_up(self, from_line, bottom, attr):
+        """Scroll up."""
+        self._insert_row(bottom, attr)
+        self._delete_row(from_line-1)
+
+    def scroll_down(self, from_line, bottom, attr):
+        """Scroll down."""
+        self._insert_row(from_line-1, attr)
+        self._delete_row(bottom-1)
 
 
 class TextBuffer(object):
@@ -93,13 +241,12 @@ class TextBuffer(object):
         for num, page in enumerate(self.pages):
             row_strs += [horiz_bar]
             for i, row in enumerate(page.row):
-                s = [ c[0] for c in row.buf ]
                 outstr = '{0:2}'.format(i)
                 if lastwrap:
                     outstr += ('\\')
                 else:
                     outstr += ('|')
-                outstr += (''.join(s))
+                outstr += page.get_row_chars(i+1)
                 if row.wrap:
                     row_strs.append(outstr + '\\ {0:2}'.format(row.end))
                 else:
@@ -110,47 +257,60 @@ class TextBuffer(object):
 
     def copy_page(self, src, dst):
         """Copy source to destination page."""
-        for x in range(self.height):
-            dstrow = self.pages[dst].row[x]
-            srcrow = self.pages[src].row[x]
-            dstrow.buf[:] = srcrow.buf[:]
+        srcpage, dstpage = self.pages[src], self.pages[dst]
+        dstpage.chars[:] = srcpage.chars
+        dstpage.attrs[:] = srcpage.attrs
+        for dstrow, srcrow in zip(dstpage.row, srcpage.row):
             dstrow.end = srcrow.end
             dstrow.wrap = srcrow.wrap
+            dstrow.dbcs_states = None
 
     def clear_area(self, pagenum, row0, col0, row1, col1, attr):
         """Clear a rectangular area of the screen."""
-        for r in range(row0-1, row1):
-            self.pages[pagenum].row[r].buf[col0-1:col1] = [(b' ', attr)] * (col1 - col0 + 1)
+        self.pages[pagenum].clear_area(row0, col0, row1, col1, attr)
+
+    def clear_rows(self, pagenum, start, stop, attr):
+        """Clear the given (inclusive) range of rows."""
+        self.pages[pagenum].clear_rows(start, stop, attr)
+
+    def clear_from(self, pagenum, row, col, attr):
+        """Clear characters from given position till end of row."""
+        self.pages[pagenum].clear_from(row, col, attr)
 
     def put_char_attr(self, pagenum, row, col, c, attr):
         """Put a byte to the screen, reinterpreting SBCS and DBCS as necessary."""
-        return self.pages[pagenum].row[row-1].put_char_attr(col, c, attr)
+        return self.pages[pagenum].put_char_attr(row, col, c, attr)
+
+    def put_chars_attr(self, pagenum, row, col, s, attr):
+        """Put a run of single-byte characters on a row, for sbcs only. Return last column."""
+        return self.pages[pagenum].put_chars_attr(row, col, s, attr)
+
+    def insert_char_attr(self, pagenum, row, col, c, attr):
+        """Insert a byte on a row; return the byte and attribute pushed off the end."""
+        return self.pages[pagenum].insert_char_attr(row, col, c, attr)
 
     def scroll_up(self, pagenum, from_line, bottom, attr):
         """Scroll up."""
-        self.pages[pagenum].row.insert(
-            bottom, TextRow(attr, self.width, self._conv, self._dbcs_enabled)
-        )
-        del self.pages[pagenum].row[from_line-1]
+        self.pages[pagenum].scroll_up(from_line, bottom, attr)
 
     def scroll_down(self, pagenum, from_line, bottom, attr):
         """Scroll down."""
-        self.pages[pagenum].row.insert(
-            from_line - 1, TextRow(attr, self.width, self._conv, self._dbcs_enabled)
-        )
-        del self.pages[pagenum].row[bottom-1]
+        self.pages[pagenum].scroll_down(from_line, bottom, attr)
 
     def get_char(self, pagenum, row, col):
         """Retrieve a byte from the screen (SBCS or DBCS half-char)."""
-        return ord(self.pages[pagenum].row[row-1].buf[col-1][0])
+        page = self.pages[pagenum]
+        return page.chars[page.index(row, col)]
 
     def get_attr(self, pagenum, row, col):
         """Retrieve attribute from the screen."""
-        return self.pages[pagenum].row[row-1].buf[col-1][1]
+        page = self.pages[pagenum]
+        return page.attrs[page.index(row, col)]
 
     def get_charwidth(self, pagenum, row, col):
         """Retrieve DBCS character width in bytes."""
-        dbcs = self.pages[pagenum].row[row-1].double[col-1]
+        page = self.pages[pagenum]
+        dbcs = page.double[page.index(row, col)]
         if dbcs == 0:
             return 1
         elif dbcs == 1:
@@ -159,42 +319,39 @@ class TextBuffer(object):
 
     def get_fullchar_attr(self, pagenum, row, col):
         """Retrieve SBCS or DBCS character."""
-        therow = self.pages[pagenum].row[row-1]
-        if therow.double[col-1] == 1:
-            ca = therow.buf[col-1]
-            da = therow.buf[col]
-            char, attr = ca[0] + da[0], da[1]
-        elif therow.double[col-1] == 0:
-            ca = therow.buf[col-1]
-            char, attr = ca[0], ca[1]
+        page = self.pages[pagenum]
+        index = page.index(row, col)
+        if page.double[index] == 1:
+            char, attr = bytes(page.chars[index:index+2]), page.attrs[index+1]
+        elif page.double[index] == 0:
+            char, attr = chr(page.chars[index]), page.attrs[index]
         else:
             char, attr = b'\0', 0
-            logging.debug('DBCS buffer corrupted at %d, %d (%d)', row, col, therow.double[col-1])
+            logging.debug('DBCS buffer corrupted at %d, %d (%d)', row, col, page.double[index])
         return char, attr
 
     def get_text_raw(self, pagenum):
         """Retrieve all raw text on a page."""
-        return tuple(
-            b''.join(c for c, _ in self.pages[pagenum].row[row_index].buf)
-            for row_index in range(self.pages[pagenum].height)
-        )
+        page = self.pages[pagenum]
+        return tuple(page.get_row_chars(row) for row in range(1, page.height+1))
 
     ###########################################################################
     # logical lines
 
     def get_text_logical(self, pagenum, start_row, start_col, stop_row, stop_col):
         """Retrieve section of logical text for copying."""
+        page = self.pages[pagenum]
         # include lead byte if start on trail
-        if self.pages[pagenum].row[start_row-1].double[start_col-1] == 2:
+        if page.double[page.index(start_row, start_col)] == 2:
             start_col -= 1
         # include trail byte if end on lead
-        if self.pages[pagenum].row[stop_row-1].double[stop_col-2] == 1:
+        if page.double[page.index(stop_row, stop_col-1)] == 1:
             stop_col += 1
         r, c = start_row, start_col
         full = []
         clip = []
         while r < stop_row or (r == stop_row and c < stop_col):
-            clip.append(self.pages[pagenum].row[r-1].buf[c-1][0])
+            clip.append(chr(page.chars[page.index(r, c)]))
             c += 1
             if c > self.pages[pagenum].row[r-1].end:
                 if not self.pages[pagenum].row[r-1].wrap:
@@ -226,11 +383,12 @@ class TextBuffer(object):
             srow, scol = self.find_start_of_line(pagenum, start_row), 1
         else:
             srow, scol = start_row, from_column
+        page = self.pages[pagenum]
         line = bytearray()
         # add all rows of the logical line
         for row in range(srow, self.height+1):
-            therow = self.pages[pagenum].row[row-1]
-            line += bytearray(pair[0] for pair in therow.buf[scol-1:therow.end])
+            therow = page.row[row-1]
+            line += page.get_row_chars(row)[scol-1:therow.end]
             # continue so long as the line wraps
             if not therow.wrap:
                 break
@@ -253,15 +411,14 @@ class TextBuffer(object):
         # INPUT returns empty string if enter pressed below prompt row
         if srow <= prompt_row:
             # add all rows of the logical line
+            page = self.pages[pagenum]
             for row in range(srow, self.height+1):
-                therow = self.pages[pagenum].row[row-1]
+                therow = page.row[row-1]
                 # exclude prompt, if any; only go from furthest_left to furthest_right
                 if row == prompt_row:
-                    rowpairs = therow.buf[:therow.end][left-1:right-1]
+                    line += page.get_row_chars(row)[:therow.end][left-1:right-1]
                 else:
-                    rowpairs = therow.buf[:therow.end]
-                # get characters from char/attr pairs and convert to bytearray
-                line += bytearray(pair[0] for pair in rowpairs)
+                    line += page.get_row_chars(row)[:therow.end]
                 if not therow.wrap:
                     break
                 # wrap before end of line means LF
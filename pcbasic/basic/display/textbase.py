@@ -99,7 +99,7 @@ class Cursor(object):
 
     def reset_attr(self, new_attr):
         """Set the text cursor attribute."""
-        if self._mode.is_text_mode:
+        if self._mode.is_text_mode and not self._queues.headless:
             self._queues.video.put(signals.Event(signals.VIDEO_SET_CURSOR_ATTR, (new_attr,)))
 
     def show(self, do_show):
@@ -184,6 +184,8 @@ class Cursor(object):
         # update cursor shape to new width if necessary
         if new_width != self.width:
             self.width = new_width
+            if self._queues.headless:
+                return
             self._queues.video.put(signals.Event(signals.VIDEO_SET_CURSOR_SHAPE,
                     (self.width, self._height, self.from_line, self.to_line)))
 
@@ -7,19 +7,27 @@ This file is released under the GNU GPL version 3 or later.
 """
 
 import logging
+import re
 
 from ..base import signals
 from ..base import error
 from ..base import tokens as tk
 from .. import values
 from . import font
-from .text import TextBuffer, TextRow
+from .text import TextBuffer
 from .textbase import BottomBar, Cursor, ScrollArea
 
 
 # mark bytes conversion explicitly
 int2byte = chr
 
+# control characters that need the text buffer; other output can be deferred when headless
+CONSOLE_CONTROLS = b'\t\n\a\x0b\x0c\x1c\x1d\x1e\x1f'
+# deferred console output is compacted, and if need be applied, beyond this many bytes
+CONSOLE_BUFFER_SIZE = 16384
+# run of characters that are put on the screen as they are, i.e. not a control code for write()
+PRINTABLE_RUN = re.compile(b'[^\t\n\r\a\x0b\x0c\x1c-\x1f]+')
+
 
 class TextScreen(object):
     """Text screen."""
@@ -52,6 +60,12 @@ class TextScreen(object):
         }
         # function key macros
         self.bottom_bar = BottomBar()
+        # stream-only console: output not yet applied to the text buffer
+        # None is a deferred clear of the current row
+        self._console = []
+        self._console_size = 0
+        # cursor position where deferred output starts; None if after clearing the scroll area
+        self._console_start = None
 
     def init_mode(self, mode, pixels, attr, vpagenum, apagenum):
         """Reset the text screen for new video mode."""
@@ -61,8 +75,9 @@ class TextScreen(object):
         self.vpagenum = vpagenum
         # set up glyph cache and preload halfwidth glyphs (i.e. single-byte code points)
         self._glyphs = font.GlyphCache(self.mode, self.fonts, self.codepage, self.queues)
-        # build the screen buffer
-        self.text = TextBuffer(
+        # build the screen buffer; deferred output is lost with the old one
+        self._console, self._console_size = [], 0
+        self._text = TextBuffer(
             self.attr, self.mode.width, self.mode.height, self.mode.num_pages,
             self.codepage, do_fullwidth=(self.mode.font_height >= 14)
         )
@@ -78,11 +93,13 @@ class TextScreen(object):
 
     def set_page(self, vpagenum, apagenum):
         """Set visible and active page."""
+        self._flush_console()
         self.vpagenum = vpagenum
         self.apagenum = apagenum
 
     def set_attr(self, attr):
         """Set attribute."""
+        self._flush_console()
         self.attr = attr
 
     def check_font_available(self, mode):
@@ -130,18 +147,151 @@ class TextScreen(object):
         """Return a string representation of the screen buffer (for debugging)."""
         return str(self.text)
 
+    @property
+    def text(self):
+        """Text buffer, brought up to date with any deferred console output."""
+        if self._console:
+            self._flush_console()
+        return self._text
+
+    ##########################################################################
+    # stream-only console
+
+    def _can_defer(self):
+        """Console output need not be applied to the text buffer until it is read."""
+        # no video consumer, and cursor in the scroll area, from where it can only scroll
+        return (
+            self.queues.headless and self.mode.is_text_mode and not self.codepage.dbcs and
+            not self._bottom_row_allowed and
+            self.scroll_area.top <= self.current_row <= self.scroll_area.bottom < self.mode.height
+        )
+
+    def _defer(self, s, per_char=False):
+        """Hold back console output, keeping track of the cursor position only."""
+        if not self._console:
+            self._console_start = self.current_row, self.current_col, self.overflow
+        width, bottom = self.mode.width, self.scroll_area.bottom
+        row, col, overflow = self.current_row, self.current_col, self.overflow
+        if s is None:
+            # clear row from start
+            col, overflow = 1, False
+            self._console.append(None)
+        else:
+            for i, run in enumerate(s.split(b'\r')):
+                if i:
+                    row, col, overflow = min(row + 1, bottom), 1, False
+                if run:
+                    # columns filled on this row, wrapping as needed
+                    filled = col - 1 + overflow + len(run)
+                    row = min(row + (filled - 1) // width, bottom)
+                    last_col = (filled - 1) % width + 1
+                    col, overflow = min(last_col + 1, width), last_col == width
+            self._console.append((s, per_char))
+            self._console_size += len(s)
+        self.current_row, self.current_col, self.overflow = row, col, overflow
+        if self._console_size > CONSOLE_BUFFER_SIZE:
+            self._compact_console()
+            if self._console_size > CONSOLE_BUFFER_SIZE // 2:
+                self._flush_console()
+
+    def _compact_console(self):
+        """Drop deferred output that would scroll out of the scroll area anyway."""
+        height = self.scroll_area.bottom - self.scroll_area.top + 1
+        crs = sum(entry[0].count(b'\r') for entry in self._console if entry)
+        # after height CRs, the cursor is on the bottom row; each further CR scrolls a row out
+        if crs < 2 * height - 1:
+            return
+        # keep what follows the height-th CR from the end
+        count = 0
+        for i in range(len(self._console)-1, -1, -1):
+            if not self._console[i]:
+                continue
+            chunk, per_char = self._console[i]
+            crs = chunk.count(b'\r')
+            if count + crs >= height:
+                pos = len(chunk)
+                for _ in range(height - count):
+                    pos = chunk.rindex(b'\r', 0, pos)
+                self._console[:i+1] = [(chunk[pos+1:], per_char)]
+                break
+            count += crs
+        self._console_size = sum(len(entry[0]) for entry in self._console if entry)
+        self._console_start = None
+
+    def _flush_console(self):
+        """Apply deferred console output to the text buffer."""
+        if not self._console:
+            return
+        self._compact_console()
+        console, self._console, self._console_size = self._console, [], 0
+        if self._console_start is None:
+            # earlier output has scrolled out: start from a clear scroll area
+            top, bottom = self.scroll_area.bounds
+            for _ in range(top, bottom+1):
+                self._text.scroll_up(self.apagenum, top, bottom, self.attr)
+            self.current_row, self.current_col, self.overflow = bottom, 1, False
+        else:
+            self.current_row, self.current_col, self.overflow = self._console_start
+        for entry in console:
+            if entry is None:
+                self._clear_from(self.current_row, 1)
+            elif entry[1]:
+                self._write(entry[0], per_char=True)
+            else:
+                self._write(entry[0])
+
+    def _console_deferrable(self, s):
+        """Output can be held back from the text buffer."""
+        return (
+            isinstance(s, bytes) and self._can_defer() and
+            len(s.translate(None, CONSOLE_CONTROLS)) == len(s)
+        )
+
     ##########################################################################
 
+    def _echo(self, s):
+        """Copy output to redirected streams."""
+        # CR -> CRLF, CRLF -> CRLF LF
+        self._io_streams.write(b''.join([(b'\r\n' if c == b'\r' else c) for c in s]))
+
     def write(self, s, scroll_ok=True, do_echo=True):
         """Write a string to the screen at the current position."""
         if do_echo:
-            # CR -> CRLF, CRLF -> CRLF LF
-            self._io_streams.write(b''.join([(b'\r\n' if c == b'\r' else c) for c in s]))
+            self._echo(s)
+        if scroll_ok and self._console_deferrable(s):
+            self._defer(s)
+        else:
+            self._write(s, scroll_ok)
+
+    def write_chars(self, s, do_echo=True):
+        """Write a string to the screen as a sequence of single-character writes."""
+        if do_echo:
+            self._echo(s)
+        if self._console_deferrable(s):
+            self._defer(s, per_char=True)
+        else:
+            self._write(s, per_char=True)
+
+    def _write(self, s, scroll_ok=True, per_char=False):
+        """Write a string to the text buffer at the current position."""
+        # per_char: behave like separate writes of each character
         last = b''
         # if our line wrapped at the end before, it doesn't anymore
         self.text.pages[self.apagenum].row[self.current_row-1].wrap = False
-        for c in s:
+        pos = 0
+        while pos < len(s):
+            run = PRINTABLE_RUN.match(s, pos)
+            if run:
+                self._write_run(run.group(), per_char)
+                pos = run.end()
+                last = s[pos-1]
+                continue
+            c = s[pos]
+            pos += 1
             row, col = self.current_row, self.current_col
+            if per_char:
+                self.text.pages[self.apagenum].row[row-1].wrap = False
+                last = b''
             if c == b'\t':
                 # TAB
                 num = (8 - (col - 1 - 8 * int((col-1) // 8)))
@@ -179,11 +329,38 @@ class TextScreen(object):
             elif c == b'\x1F':
                 # DOWN
                 self.set_pos(row + 1, col, scroll_ok)
-            else:
-                # includes \b, \0, and non-control chars
-                self.write_char(c)
             last = c
 
+    def _write_run(self, s, per_char=False):
+        """Write a run of non-control characters, a row at a time where possible."""
+        # this includes \b and \0, which are put on the screen like any other char
+        width = self.mode.width
+        while s:
+            row, col = self.current_row, self.current_col
+            if per_char:
+                self.text.pages[self.apagenum].row[row-1].wrap = False
+            if (
+                    self.overflow or self._bottom_row_allowed or self.codepage.dbcs
+                    or not (self.scroll_area.top <= row <= self.scroll_area.bottom)
+                    or not (1 <= col <= width)
+                ):
+                # wrapping, scrolling and dbcs need the full treatment
+                self.write_char(s[0])
+                s = s[1:]
+                continue
+            # the part of the run that fits on the current row
+            stop = min(col + len(s) - 1, width)
+            self._put_run(row, col, s[:stop-col+1])
+            s = s[stop-col+1:]
+            therow = self.text.pages[self.apagenum].row[row-1]
+            therow.end = max(therow.end, stop)
+            # if on the last column, only move cursor to the next row when the next char is printed
+            if stop < width:
+                self._move_cursor(row, stop + 1)
+            else:
+                self.overflow = True
+                self._move_cursor(row, width)
+
     def write_line(self, s=b'', scroll_ok=True, do_echo=True):
         """Write a string to the screen and end with a newline."""
         self.write(b'%s\r' % (s,), scroll_ok, do_echo)
@@ -208,6 +385,7 @@ class TextScreen(object):
 
     def write_char(self, c, do_scroll_down=False):
         """Put one character at the current position."""
+        self._flush_console()
         # check if scroll& repositioning needed
         if self.overflow:
             self.current_col += 1
@@ -247,6 +425,7 @@ class TextScreen(object):
 
     def start_line(self):
         """Move the cursor to the start of the next line, this line if empty."""
+        self._flush_console()
         if self.current_col != 1:
             self._io_streams.write(b'\r\n')
             self._check_pos(scroll_ok=True)
@@ -259,6 +438,7 @@ class TextScreen(object):
 
     def set_pos(self, to_row, to_col, scroll_ok=True):
         """Set the current position."""
+        self._flush_console()
         self.overflow = False
         self.current_row, self.current_col = to_row, to_col
         # move cursor and reset cursor attribute
@@ -337,9 +517,10 @@ class TextScreen(object):
             0xf & self.text.get_attr(self.apagenum, self.current_row, self.current_col)
         )
         self.cursor.reset_attr(fore)
-        self.queues.video.put(signals.Event(
-            signals.VIDEO_MOVE_CURSOR, (self.current_row, self.current_col))
-        )
+        if not self.queues.headless:
+            self.queues.video.put(signals.Event(
+                signals.VIDEO_MOVE_CURSOR, (self.current_row, self.current_col))
+            )
 
     def move_to_end(self):
         """Jump to end of logical line; follow wraps (END)."""
@@ -362,32 +543,55 @@ class TextScreen(object):
         # update the screen
         self.refresh_range(pagenum, row, start, stop)
 
+    def _put_run(self, row, col, s):
+        """Put a run of single-byte characters in the current attribute on the active page."""
+        attr = self.attr if self.mode.is_text_mode else self.attr & 0xf
+        stop = self.text.put_chars_attr(self.apagenum, row, col, s, attr)
+        if not self.mode.is_text_mode:
+            self.refresh_range(self.apagenum, row, col, stop)
+        elif not self.queues.headless:
+            for char in set(s):
+                self._glyphs.check_char(char)
+            fore, back, blink, underline = self.mode.split_attr(attr)
+            self.queues.video.put(signals.Event(
+                signals.VIDEO_PUT_TEXT, (
+                    self.apagenum, row, col, [self.codepage.to_unicode(char, u'\0') for char in s],
+                    fore, back, blink, underline,
+                )
+            ))
+
     ###########################################################################
 
     def refresh_range(self, pagenum, row, start, stop, text_only=False):
         """Redraw a section of a screen row, assuming DBCS buffer has been set."""
+        headless = self.queues.headless
+        # without a video consumer, only the pixel buffer needs updating
+        if headless and (self.mode.is_text_mode or text_only):
+            return
         therow = self.text.pages[pagenum].row[row-1]
         col = start
         while col <= stop:
             r, c = row, col
             char, attr = self.text.get_fullchar_attr(pagenum, row, col)
             col += len(char)
-            # ensure glyph is stored
-            self._glyphs.check_char(char)
             fore, back, blink, underline = self.mode.split_attr(attr)
-            self.queues.video.put(signals.Event(
-                signals.VIDEO_PUT_GLYPH, (
-                    pagenum, r, c, self.codepage.to_unicode(char, u'\0'),
-                    len(char) > 1, fore, back, blink, underline,
-                )
-            ))
+            if not headless:
+                # ensure glyph is stored
+                self._glyphs.check_char(char)
+                self.queues.video.put(signals.Event(
+                    signals.VIDEO_PUT_GLYPH, (
+                        pagenum, r, c, self.codepage.to_unicode(char, u'\0'),
+                        len(char) > 1, fore, back, blink, underline,
+                    )
+                ))
             if not self.mode.is_text_mode and not text_only:
                 # update pixel buffer
                 x0, y0, x1, y1, sprite = self._glyphs.get_sprite(r, c, char, fore, back)
                 self.pixels.pages[self.apagenum].put_rect(x0, y0, x1, y1, sprite, tk.PSET)
-                self.queues.video.put(signals.Event(
-                    signals.VIDEO_PUT_RECT, (self.apagenum, x0, y0, x1, y1, sprite)
-                ))
+                if not headless:
+                    self.queues.video.put(signals.Event(
+                        signals.VIDEO_PUT_RECT, (self.apagenum, x0, y0, x1, y1, sprite)
+                    ))
 
     def _redraw_row(self, start, row, wrap=True):
         """Draw the screen row, wrapping around and reconstructing DBCS buffer."""
@@ -408,12 +612,19 @@ class TextScreen(object):
 
     def clear_from(self, srow, scol):
         """Clear from given position to end of logical line (CTRL+END)."""
-        self.text.pages[self.apagenum].row[srow-1].clear_from(scol, self.attr)
+        if srow == self.current_row and scol == 1 and self._can_defer():
+            self._defer(None)
+        else:
+            self._clear_from(srow, scol)
+
+    def _clear_from(self, srow, scol):
+        """Clear from given position to end of logical line in the text buffer."""
+        self.text.clear_from(self.apagenum, srow, scol, self.attr)
         row = srow
         # can use self.text.find_end_of_line
         while self.text.pages[self.apagenum].row[row-1].wrap:
             row += 1
-            self.text.pages[self.apagenum].row[row-1].clear(self.attr)
+            self.text.clear_from(self.apagenum, row, 1, self.attr)
         for r in range(row, srow, -1):
             self.text.pages[self.apagenum].row[r-1].wrap = False
             self.scroll(r)
@@ -434,16 +645,16 @@ class TextScreen(object):
 
     def clear_rows(self, start, stop):
         """Clear text and graphics on given (inclusive) text row range."""
-        for r in self.text.pages[self.apagenum].row[start-1:stop]:
-            r.clear(self.attr)
-            # can't we just do this in row.clear?
-            r.wrap = False
+        self.text.clear_rows(self.apagenum, start, min(stop, self.mode.height), self.attr)
+        for therow in self.text.pages[self.apagenum].row[start-1:stop]:
+            therow.wrap = False
         if not self.mode.is_text_mode:
             x0, y0, x1, y1 = self.mode.text_to_pixel_area(start, 1, stop, self.mode.width)
             # background attribute must be 0 in graphics mode
             self.pixels.pages[self.apagenum].fill_rect(x0, y0, x1, y1, 0)
-        _, back, _, _ = self.mode.split_attr(self.attr)
-        self.queues.video.put(signals.Event(signals.VIDEO_CLEAR_ROWS, (back, start, stop)))
+        if not self.queues.headless:
+            _, back, _, _ = self.mode.split_attr(self.attr)
+            self.queues.video.put(signals.Event(signals.VIDEO_CLEAR_ROWS, (back, start, stop)))
 
     def _clear_area(self, start_row, stop_row):
         """Clear the screen or the scroll area."""
@@ -471,6 +682,7 @@ class TextScreen(object):
 
     def _set_scroll_area(self, start, stop):
         """Set the scroll area."""
+        self._flush_console()
         self.scroll_area.set(start, stop)
         #set_pos(start, 1)
         self.overflow = False
@@ -481,12 +693,14 @@ class TextScreen(object):
 
     def scroll(self, from_line=None):
         """Scroll the scroll region up by one line, starting at from_line."""
+        self._flush_console()
         if from_line is None:
             from_line = self.scroll_area.top
-        _, back, _, _ = self.mode.split_attr(self.attr)
-        self.queues.video.put(signals.Event(
-            signals.VIDEO_SCROLL_UP, (from_line, self.scroll_area.bottom, back)
-        ))
+        if not self.queues.headless:
+            _, back, _, _ = self.mode.split_attr(self.attr)
+            self.queues.video.put(signals.Event(
+                signals.VIDEO_SCROLL_UP, (from_line, self.scroll_area.bottom, back)
+            ))
         if self.current_row > from_line:
             self.current_row -= 1
         # sync buffers with the new screen reality:
@@ -500,10 +714,12 @@ class TextScreen(object):
 
     def scroll_down(self, from_line):
         """Scroll the scroll region down by one line, starting at from_line."""
-        _, back, _, _ = self.mode.split_attr(self.attr)
-        self.queues.video.put(signals.Event(
-            signals.VIDEO_SCROLL_DOWN, (from_line, self.scroll_area.bottom, back)
-        ))
+        self._flush_console()
+        if not self.queues.headless:
+            _, back, _, _ = self.mode.split_attr(self.attr)
+            self.queues.video.put(signals.Event(
+                signals.VIDEO_SCROLL_DOWN, (from_line, self.scroll_area.bottom, back)
+            ))
         if self.current_row >= from_line:
             self.current_row += 1
         # sync buffers with the new screen reality:
@@ -587,9 +803,8 @@ class TextScreen(object):
             row, col = self.current_row, self.current_col
             while True:
                 therow = self.text.pages[self.apagenum].row[row-1]
-                therow.buf.insert(col-1, (c, attr))
+                pushed_out = self.text.insert_char_attr(self.apagenum, row, col, c, attr)
                 if therow.end < self.mode.width:
-                    therow.buf.pop()
                     if therow.end > col-1:
                         therow.end += 1
                     else:
@@ -602,7 +817,7 @@ class TextScreen(object):
                     if not therow.wrap and row < self.mode.height:
                         self.scroll_down(row+1)
                         therow.wrap = True
-                    c, attr = therow.buf.pop()
+                    c, attr = pushed_out
                     row += 1
                     col = 1
             # move cursor by one character
@@ -657,6 +872,7 @@ class TextScreen(object):
 
     def locate_(self, args):
         """LOCATE: Set cursor position, shape and visibility."""
+        self._flush_console()
         args = list(None if arg is None else values.to_int(arg) for arg in args)
         args = args + [None] * (5-len(args))
         row, col, cursor, start, stop = args
@@ -736,6 +952,7 @@ class TextScreen(object):
 
     def view_print_(self, args):
         """VIEW PRINT: set scroll region."""
+        self._flush_console()
         start, stop = (None if arg is None else values.to_int(arg) for arg in args)
         if start is None and stop is None:
             self.scroll_area.unset()
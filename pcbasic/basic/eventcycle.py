@@ -119,6 +119,8 @@ class EventQueues(object):
         self.inputs = inputs or NullQueue()
         self.video = video or NullQueue()
         self.audio = audio or NullQueue()
+        # no video consumer: the display keeps its state but doesn't build video events
+        self.headless = video is None
 
     def __getstate__(self):
         """Don't pickle queues."""
@@ -53,6 +53,7 @@ class Implementation(object):
             codepage=None, box_protect=True, font=None, text_width=80,
             video=u'cga', monitor=u'rgb', aspect_ratio=(4, 3), low_intensity=False,
             devices=None, current_device=u'Z:', mount=None, utf8=False, soft_linefeed=False,
+            mmap_files=None, overlay=None,
             keys=u'', check_keybuffer_full=True, ctrl_c_is_break=True,
             hide_listing=None, hide_protected=False,
             peek_values=None, allow_code_poke=False, rebuild_offsets=True,
@@ -146,7 +147,7 @@ class Implementation(object):
         self.files = Files(
             self.values, self.memory, self.queues, self.keyboard, self.display,
             max_files, max_reclen, serial_buffer_size,
-            devices, current_device, mount, utf8, not soft_linefeed
+            devices, current_device, mount, utf8, not soft_linefeed, mmap_files, overlay
         )
         # set up the SHELL command
         # Files needed for current disk device
@@ -381,13 +382,23 @@ class Implementation(object):
             yield
         except error.Break:
             self.sound.stop_all_sound()
+            self._flush_files()
             self._prompt = False
         except error.BASICError as e:
+            self._flush_files()
             self._handle_error(e)
             self._prompt = True
         except error.Exit:
             raise
 
+    def _flush_files(self):
+        """Write out data held back by files when the program stops."""
+        try:
+            self.files.flush_all()
+        except error.BASICError:
+            # data is kept and errors will be raised again on CLOSE
+            pass
+
     def _handle_error(self, e):
         """Handle a BASIC error through error message."""
         # not handled by ON ERROR, stop execution
@@ -474,6 +485,8 @@ class Implementation(object):
         self.screen.cursor.show(True)
         # sound stops playing and is forgotten
         self.sound.stop_all_sound()
+        # the shell may read our files
+        self.files.flush_all()
         # run the os-specific shell
         self.shell.launch(cmd)
         # reset cursor visibility to its previous state
@@ -585,6 +598,8 @@ class Implementation(object):
         list(args)
         if self.program.protected and merge:
             raise error.BASICError(error.IFC)
+        # files stay open, but the chained program starts with a clean slate
+        self.files.flush_all()
         # gather COMMON declarations
         commons = self.interpreter.gather_commons()
         with self.memory.preserve_commons(commons, common_all):
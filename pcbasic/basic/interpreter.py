@@ -348,6 +348,15 @@ class Interpreter(object):
         onvar = values.to_int(next(args))
         error.range_check(0, 255, onvar)
         jump_type = next(args)
+        if self.run_mode:
+            ins = self._program_code
+            key = ins.tell()
+            if key not in self._program.jump_vectors:
+                self._program.jump_vectors[key] = self._find_jump_vector(ins)
+            vector = self._program.jump_vectors[key]
+            if vector is not None:
+                self._jump_vector(ins, vector, onvar, jump_type)
+                return
         # only parse jumps (and errors!) up to our choice
         i = -1
         for i, jumpnum in enumerate(args):
@@ -361,6 +370,41 @@ class Interpreter(object):
             # missing jump *just where we need it* is an error
             raise error.BASICError(error.STX)
 
+    def _find_jump_vector(self, ins):
+        """Helper function for ON: scan jump list into targets and end position."""
+        start = ins.tell()
+        targets = []
+        while ins.skip_blank_read_if((tk.T_UINT,)):
+            jumpnum, = struct.unpack('<H', ins.read(2))
+            # code position of target line, or None if undefined; position after the jump number
+            targets.append((self._program.line_numbers.get(jumpnum), ins.tell()))
+            if not ins.skip_blank_read_if((b',',)):
+                break
+        clean = ins.skip_blank() in tk.END_STATEMENT
+        end = ins.tell()
+        ins.seek(start)
+        # lists that end in a syntax error are left to the parser
+        if not clean:
+            return None
+        return targets, end
+
+    def _jump_vector(self, ins, vector, onvar, jump_type):
+        """Helper function for ON: jump using a precomputed vector."""
+        targets, end = vector
+        if 0 < onvar <= len(targets):
+            target, afterpos = targets[onvar-1]
+            ins.seek(afterpos)
+            if target is None:
+                raise error.BASICError(error.UNDEFINED_LINE_NUMBER)
+            self.set_pointer(True, target)
+            if jump_type == tk.GOSUB:
+                self.gosub_stack.append((afterpos, True, None))
+            return
+        ins.seek(end)
+        if onvar == len(targets) + 1:
+            # missing jump *just where we need it* is an error
+            raise error.BASICError(error.STX)
+
     ###########################################################################
     # loops
 
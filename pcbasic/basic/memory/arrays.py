@@ -96,6 +96,10 @@ class Arrays(object):
         """Return a memoryview to a full array."""
         return memoryview(self._buffers[name])
 
+    def apply(self, name, float_function):
+        """Apply a values.FloatFunction in-place to all elements of a Single or Double array."""
+        float_function.apply(self._values, self._buffers[name], name[-1])
+
     def dimensions(self, name):
         """Return the dimensions of an array."""
         return self._dims[name]
@@ -278,11 +282,13 @@ class Arrays(object):
 
     def get_strings(self):
         """Return a list of views of string array elements."""
+        # skip never-assigned elements (length and address zero), they can't point to string space
         return [
             memoryview(buf)[i:i+3]
             for name, buf in self._buffers.iteritems()
             if name[-1] == values.STR
             for i in range(0, len(buf), 3)
+            if buf[i] or buf[i+1] or buf[i+2]
         ]
 
 
@@ -80,6 +80,8 @@ class Program(object):
         self.line_numbers = {65536: 0}
         self.last_stored = None
         self.code_size = self.bytecode.tell()
+        # precomputed ON jump vectors by code position; cleared whenever the code changes
+        self.jump_vectors = {}
 
     def truncate(self, rest=b''):
         """Write bytecode and cut the program of beyond the current position."""
@@ -104,6 +106,7 @@ class Program(object):
     def rebuild_line_dict(self):
         """Preparse to build line number dictionary."""
         self.line_numbers, offsets = {}, []
+        self.jump_vectors = {}
         self.bytecode.seek(0)
         scanline, scanpos, last = 0, 0, 0
         while True:
@@ -154,6 +157,7 @@ class Program(object):
             del self.line_numbers[key]
         for key in beyond:
             self.line_numbers[key] += length
+        self.jump_vectors = {}
 
     def check_number_start(self, linebuf):
         """Check if the given line buffer starts with a line number."""
@@ -204,6 +208,7 @@ class Program(object):
         self.update_line_dict(pos, afterpos, length, deleteable, beyond)
         if not empty:
             self.line_numbers[scanline] = pos
+            self.jump_vectors = {}
         self.last_stored = scanline
 
     def find_pos_line_dict(self, fromline, toline):
@@ -323,6 +328,7 @@ class Program(object):
             new_lines[old_to_new[old_line]] = self.line_numbers[old_line]
             del self.line_numbers[old_line]
         self.line_numbers.update(new_lines)
+        self.jump_vectors = {}
         return old_to_new
 
     def load(self, g):
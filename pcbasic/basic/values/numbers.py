@@ -25,6 +25,8 @@ This file is released under the GNU GPL version 3.
 import binascii
 import struct
 import math
+import re
+from collections import OrderedDict
 
 from ..base import tokens as tk
 from ..base import error
@@ -40,6 +42,8 @@ BLANKS = b' \t\n'
 # ASCII separators - these cause string representations to evaluate to zero
 SEPARATORS = b'\x1c\x1d\x1f'
 
+# number of decimal conversions to keep, by type, raw bytes and number of digits
+DECIMAL_CACHE_SIZE = 1024
 
 
 ##############################################################################
@@ -442,17 +446,17 @@ class Float(Number):
 
     def to_value(self):
         """Return value as Python float."""
-        exp = ord(self._buffer[-1]) - self._bias
-        if exp == -self._bias:
+        exp = ord(self._buffer[-1])
+        if not exp:
             return 0.
-        # unpack as unsigned long int
-        man = struct.unpack(self._intformat, bytearray(self._buffer[:-1]) + b'\0')[0]
+        # unpack as unsigned long int and drop the exponent byte
+        man = struct.unpack_from(self._intformat, self._buffer)[0] & self._mask
         # prepend assumed bit and apply sign
         if man & self._signmask:
             man = -man
         else:
             man |= self._signmask
-        return man * 2.**exp
+        return man * self._scale[exp]
 
     def from_value(self, in_float):
         """Set to value of Python float."""
@@ -656,18 +660,22 @@ class Float(Number):
 
     def to_decimal(self, digits=None):
         """Return value as mantissa and decimal exponent."""
-        if digits is None:
-            # we'd be better off storing these (and self._ten) in denormalised form
-            lim_bot = self.new().from_bytes(self._lim_bot)
-            lim_top = self.new().from_bytes(self._lim_top)
-            digits = self.digits
-        elif digits > 0:
-            lim_bot = self.new().from_int(10**(digits-1))._just_under()
-            lim_top = self.new().from_int(10**digits)._just_under()
-        else:
+        key = (self.sigil, self._buffer.tobytes(), digits)
+        try:
+            # move to most-recently-used position
+            decimal = _decimal_cache.pop(key)
+        except KeyError:
+            decimal = self._to_decimal(digits)
+            if len(_decimal_cache) >= DECIMAL_CACHE_SIZE:
+                _decimal_cache.popitem(last=False)
+        _decimal_cache[key] = decimal
+        return decimal
+
+    def _to_decimal(self, digits):
+        """Convert to mantissa and decimal exponent, without caching."""
+        if digits is not None and digits <= 0:
             return 0, 0
-        tden = lim_top._denormalise()
-        bden = lim_bot._denormalise()
+        bden, tden = self._decimal_limits(digits)
         exp10 = 0
         den = self._denormalise()
         while self._abs_gt_den(den, tden):
@@ -693,6 +701,22 @@ class Float(Number):
         num = -(man >> 8) if neg else man >> 8
         return num, exp10
 
+    def _decimal_limits(self, digits):
+        """Get denormalised bounds for a decimal mantissa of the given number of digits."""
+        try:
+            return _decimal_limits[(self.sigil, digits)]
+        except KeyError:
+            pass
+        if digits is None:
+            lim_bot = self.new().from_bytes(self._lim_bot)
+            lim_top = self.new().from_bytes(self._lim_top)
+        else:
+            lim_bot = self.new().from_int(10**(digits-1))._just_under()
+            lim_top = self.new().from_int(10**digits)._just_under()
+        limits = lim_bot._denormalise(), lim_top._denormalise()
+        _decimal_limits[(self.sigil, digits)] = limits
+        return limits
+
     def from_decimal(self, mantissa, exp10):
         """Set value to mantissa and decimal exponent."""
         den = self.from_int(mantissa)._denormalise()
@@ -813,6 +837,7 @@ class Float(Number):
 
     _one = None
     _ten = None
+    _ten_den = None
     _lim_bot = None
     _lim_top = None
 
@@ -847,8 +872,7 @@ class Float(Number):
 
     def _div10_den(self, lden):
         """Divide by 10 in-place."""
-        exp, man, neg = self._div_den(lden,
-            self.new().from_bytes(self._ten)._denormalise())
+        exp, man, neg = self._div_den(lden, self._ten_den)
         # perhaps this should be in _div_den
         while man < self._den_mask:
             exp -= 1
@@ -867,6 +891,7 @@ class Float(Number):
 
     _bias = None
     _shift = None
+    _scale = None
     _intformat = None
     _mask = None
     _posmask = None
@@ -1041,6 +1066,11 @@ class Float(Number):
         return lexp, lman, lneg
 
 
+def _scale_table(bias):
+    """Powers of two for each exponent byte, to scale an integer mantissa to a Python float."""
+    return tuple(2.**(_exp - bias) for _exp in range(256))
+
+
 ##############################################################################
 # single-precision floating-point number
 
@@ -1060,6 +1090,7 @@ class Single(Float):
 
     _bias = 128 + 24
     _shift = _bias - 129
+    _scale = _scale_table(_bias)
 
     _den_mask = 0x80000000
     _den_upper = _den_mask * 2
@@ -1071,6 +1102,8 @@ class Single(Float):
 
     _one = b'\x00\x00\x00\x81'
     _ten = b'\x00\x00\x20\x84'
+    # _ten in denormalised form
+    _ten_den = 0x84, 0xa0000000, False
     _lim_top = b'\x7f\x96\x18\x98' # 9999999, highest float less than 10e+7
     _lim_bot = b'\xff\x23\x74\x94' # 999999.9, highest float  less than 10e+6
 
@@ -1117,6 +1150,7 @@ class Double(Float):
 
     _bias = 128 + 56
     _shift = _bias - 129
+    _scale = _scale_table(_bias)
 
     _den_mask = 0x8000000000000000
     _den_upper = _den_mask * 2
@@ -1128,6 +1162,8 @@ class Double(Float):
 
     _one = b'\x00\x00\x00\x00\x00\x00\x00\x81'
     _ten = b'\x00\x00\x00\x00\x00\x00\x20\x84'
+    # _ten in denormalised form
+    _ten_den = 0x84, 0xa000000000000000, False
     _lim_top = b'\xff\xff\x03\xbf\xc9\x1b\x0e\xb6' # highest float less than 10e+16
     _lim_bot = b'\xff\xff\x9f\x31\xa9\x5f\x63\xb2' # highest float less than 10e+15
 
@@ -1168,11 +1204,23 @@ class Double(Float):
         return self.to_single()
 
 
+# cache of decimal representations for to_decimal
+_decimal_cache = OrderedDict()
+# denormalised limits for to_decimal, by type and number of digits
+_decimal_limits = {}
+
+
 ##############################################################################
 # convert string representation to float
 
+# plain decimal representation without blanks; E and D exponents are upper case
+_DECIMAL_RE = re.compile(br'([+-]?)([0-9]*)(?:\.([0-9]*))?(?:([DE])([+-]?)([0-9]*))?')
+
 def str_to_decimal(s, allow_nonnum=True):
     """Return Float value for Python string."""
+    decimal = _plain_str_to_decimal(s)
+    if decimal is not None:
+        return decimal
     found_sign, found_point, found_exp = False, False, False
     found_exp_sign, exp_neg, neg = False, False, False
     exp10, exponent, mantissa, digits, zeros = 0, 0, 0, 0, 0
@@ -1248,6 +1296,33 @@ def str_to_decimal(s, allow_nonnum=True):
         is_double = True
     return is_double, -mantissa if neg else mantissa, exp10
 
+def _plain_str_to_decimal(s):
+    """Parse a plain decimal representation in one go; None if the general parser is needed."""
+    match = _DECIMAL_RE.match(s)
+    sign, intpart, fracpart, exp_char, exp_sign, exponent = match.groups()
+    is_double = exp_char == b'D'
+    is_single = False
+    end = match.end()
+    if end < len(s):
+        # type sigils end the number, but only if there is no exponent
+        if exp_char is not None or s[end] not in b'!#':
+            return None
+        is_single = s[end] == b'!'
+        is_double = s[end] == b'#'
+    fracpart = fracpart or b''
+    # count significant digits, but not trailing zeros after the decimal point
+    digitstr = (intpart + fracpart).lstrip(b'0')
+    digits = len(digitstr)
+    zeros = len(fracpart) - len(fracpart.rstrip(b'0')) if digits else 0
+    mantissa = int(digitstr) if digits else 0
+    exp10 = -len(fracpart)
+    if exponent:
+        exp10 += -int(exponent) if exp_sign == b'-' else int(exponent)
+    # eight or more digits means double, unless single override
+    if digits - zeros > 7 and not is_single:
+        is_double = True
+    return is_double, -mantissa if sign == b'-' else mantissa, exp10
+
 def _get_digits(mantissa, n_digits, remove_trailing):
     """Get the digits for an int."""
     digitstr = (b'%d' % abs(mantissa)).rjust(n_digits, b'0')
@@ -7,6 +7,8 @@ This file is released under the GNU GPL version 3 or later.
 """
 
 import struct
+
+from ..base import error
 from . import values
 
 
@@ -18,7 +20,8 @@ class Randomiser(object):
     """Linear Congruential Generator """
 
     _step = 4455680 # 0x43fd00
-    _period = 2**24
+    _bits = 24
+    _period = 2**_bits
     _multiplier = 214013
     _increment = 2531011
 
@@ -72,10 +75,32 @@ class Randomiser(object):
             else:
                 # use integer value of mantissa
                 self._cycle(f.mantissa())
-        # seed/period
-        return self._values.new_single().from_int(self._seed).idiv(
-            self._values.new_single().from_int(self._period)
-        )
+        return self._values.new_single().from_bytes(self._to_single_bytes())
+
+    def fill(self, buf, typechar=values.SNG):
+        """Fill a buffer of packed Single or Double values, such as an array, with RND values."""
+        if typechar not in (values.SNG, values.DBL):
+            raise error.BASICError(error.TYPE_MISMATCH)
+        size = values.size_bytes(typechar)
+        # a Double holds the Single value in its last four bytes
+        pad = b'\0' * (size - 4)
+        count = len(buf) // size
+        out = []
+        for _ in range(count):
+            self._cycle(1)
+            out.append(pad + self._to_single_bytes())
+        buf[:count*size] = b''.join(out)
+
+    def _to_single_bytes(self):
+        """Get seed/period in Single representation."""
+        seed = self._seed
+        if not seed:
+            return b'\0\0\0\0'
+        # seed/period is exactly representable: the mantissa is the seed, shifted to the top bit
+        length = seed.bit_length()
+        man = (seed << (self._bits - length)) & 0x7fffff
+        # replace the assumed bit with the positive sign; bias the exponent by 128
+        return struct.pack('<L', man | ((128 - self._bits + length) << 24))
 
     def _cycle(self, n):
         """Get a value from the random number generator (int argument)."""
@@ -38,6 +38,10 @@ class String(numbers.Value):
         length, address = struct.unpack('<BH', self._buffer)
         return self._stringspace.view(length, address).tobytes()
 
+    def view_str(self):
+        """View on the string value, without copying where possible."""
+        return self._stringspace.view(*self.to_pointer())
+
     def from_str(self, python_str):
         """Set to value of python str."""
         self._buffer[:] = struct.pack('<BH', *self._stringspace.store(python_str))
@@ -58,7 +62,9 @@ class String(numbers.Value):
 
     def add(self, right):
         """Concatenate strings. In-place for the pointer."""
-        return self.new().from_str(self.dereference() + right.dereference())
+        return self.new().from_pointer(
+            *self._stringspace.concatenate(self.to_pointer(), right.to_pointer())
+        )
 
     def eq(self, right):
         """This string equals the right-hand side."""
@@ -219,18 +225,36 @@ class StringSpace(object):
             raise error.BASICError(error.STRING_TOO_LONG)
         # don't store if address is provided (code or FIELD strings)
         if address is None:
-            # reserve string space; collect garbage if necessary
-            if check_free:
-                self._memory.check_free(length, error.OUT_OF_STRING_SPACE)
-            # find new string address
-            self.current -= length
-            address = self.current + 1
+            address = self._allocate(length, check_free)
             # don't store empty strings
             if length > 0:
                 # copy and convert to bytearray
                 self._strings[address] = bytearray(in_str)
         return length, address
 
+    def concatenate(self, left, right):
+        """Store the concatenation of two strings given by pointers; return the new pointer."""
+        # copy out before allocating, as garbage collection may move the operands
+        joined = bytearray(self.view(*left))
+        joined += self.view(*right)
+        length = len(joined)
+        if length > 255:
+            raise error.BASICError(error.STRING_TOO_LONG)
+        address = self._allocate(length, check_free=True)
+        if length > 0:
+            # the new buffer is ours, no need for another copy
+            self._strings[address] = joined
+        return length, address
+
+    def _allocate(self, length, check_free):
+        """Reserve string space at the top and return the address."""
+        # reserve string space; collect garbage if necessary
+        if check_free:
+            self._memory.check_free(length, error.OUT_OF_STRING_SPACE)
+        # find new string address
+        self.current -= length
+        return self.current + 1
+
     def _delete_last(self):
         """Delete the string provided if it is at the top of string space."""
         last_address = self.current + 1
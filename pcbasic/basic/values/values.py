@@ -117,6 +117,9 @@ def float_safe(fn):
     wrapped_fn.__name__ = fn.__name__
     return wrapped_fn
 
+# number of recent arguments remembered by each float function
+FLOAT_MEMO_SIZE = 64
+
 def _call_float_function(fn, *args):
     """Convert to IEEE 754, apply function, convert back."""
     args = list(args)
@@ -140,6 +143,47 @@ def _call_float_function(fn, *args):
         return feh.handle(e.__class__(infty))
 
 
+class FloatFunction(object):
+    """Single-argument float function with a memo of recent arguments."""
+
+    def __init__(self, fn, memo_size=FLOAT_MEMO_SIZE):
+        """Wrap a function on Python floats; memo_size=0 disables the memo."""
+        self._fn = fn
+        self._memo_size = memo_size
+        self._memo = {}
+
+    def __call__(self, x):
+        """Apply to a BASIC number; returns a new Single or Double."""
+        values = pass_number(x)._values
+        try:
+            # to_float can overflow on Double.pos_max
+            arg = x.to_float(values.double_math)
+            key = arg.sigil, arg.view().tobytes()
+            try:
+                return values.from_bytes(self._memo[key])
+            except KeyError:
+                pass
+            result = arg.new().from_value(self._fn(arg.to_value()))
+        except (ValueError, ArithmeticError):
+            # leave the error handling to the general path
+            return _call_float_function(self._fn, x)
+        if self._memo_size:
+            if len(self._memo) >= self._memo_size:
+                self._memo.clear()
+            self._memo[key] = result.to_bytes()
+        return result
+
+    def apply(self, values, buf, typechar):
+        """Apply in-place to a buffer of packed Single or Double values, such as an array."""
+        if typechar not in (SNG, DBL):
+            raise error.BASICError(error.TYPE_MISMATCH)
+        size = TYPE_TO_SIZE[typechar]
+        buf = memoryview(buf)
+        for offset in range(0, len(buf) - size + 1, size):
+            element = buf[offset:offset+size]
+            element[:] = to_type(typechar, self(values.create(element))).view()
+
+
 class FloatErrorHandler(object):
     """Handles floating point errors."""
 
@@ -379,23 +423,26 @@ def mkd_(args):
 def cvi_(args):
     """CVI: return the int value of a byte representation."""
     x, = args
-    cstr = pass_string(x).to_str()
-    error.throw_if(len(cstr) < 2)
-    return x._values.from_bytes(cstr[:2])
+    # read in place, e.g. straight from a FIELD buffer
+    cview = pass_string(x).view_str()
+    error.throw_if(len(cview) < 2)
+    return x._values.from_bytes(cview[:2])
 
 def cvs_(args):
     """CVS: return the single-precision value of a byte representation."""
     x, = args
-    cstr = pass_string(x).to_str()
-    error.throw_if(len(cstr) < 4)
-    return x._values.from_bytes(cstr[:4])
+    # read in place, e.g. straight from a FIELD buffer
+    cview = pass_string(x).view_str()
+    error.throw_if(len(cview) < 4)
+    return x._values.from_bytes(cview[:4])
 
 def cvd_(args):
     """CVD: return the double-precision value of a byte representation."""
     x, = args
-    cstr = pass_string(x).to_str()
-    error.throw_if(len(cstr) < 8)
-    return x._values.from_bytes(cstr[:8])
+    # read in place, e.g. straight from a FIELD buffer
+    cview = pass_string(x).view_str()
+    error.throw_if(len(cview) < 8)
+    return x._values.from_bytes(cview[:8])
 
 
 ###############################################################################
@@ -515,37 +562,37 @@ def fix_(args):
 def sqr_(args):
     """Square root."""
     x, = args
-    return _call_float_function(math.sqrt, x)
+    return FLOAT_FUNCTIONS[tk.SQR](x)
 
 def exp_(args):
     """Exponential."""
     x, = args
-    return _call_float_function(math.exp, x)
+    return FLOAT_FUNCTIONS[tk.EXP](x)
 
 def sin_(args):
     """Sine."""
     x, = args
-    return _call_float_function(math.sin, x)
+    return FLOAT_FUNCTIONS[tk.SIN](x)
 
 def cos_(args):
     """Cosine."""
     x, = args
-    return _call_float_function(math.cos, x)
+    return FLOAT_FUNCTIONS[tk.COS](x)
 
 def tan_(args):
     """Tangent."""
     x, = args
-    return _call_float_function(math.tan, x)
+    return FLOAT_FUNCTIONS[tk.TAN](x)
 
 def atn_(args):
     """Inverse tangent."""
     x, = args
-    return _call_float_function(math.atan, x)
+    return FLOAT_FUNCTIONS[tk.ATN](x)
 
 def log_(args):
     """Logarithm."""
     x, = args
-    return _call_float_function(math.log, x)
+    return FLOAT_FUNCTIONS[tk.LOG](x)
 
 
 ######################################################################
@@ -697,6 +744,18 @@ def string_(args):
         char = int2byte(ascval)
     return strings.String(None, asc_value_or_char._values).from_str(char * num)
 
+# transcendental functions by token
+FLOAT_FUNCTIONS = {
+    tk.SQR: FloatFunction(math.sqrt),
+    tk.EXP: FloatFunction(math.exp),
+    tk.SIN: FloatFunction(math.sin),
+    tk.COS: FloatFunction(math.cos),
+    tk.TAN: FloatFunction(math.tan),
+    tk.ATN: FloatFunction(math.atan),
+    tk.LOG: FloatFunction(math.log),
+}
+
+
 ##############################################################################
 # binary operations
 
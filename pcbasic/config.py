@@ -12,6 +12,7 @@ import sys
 import ConfigParser
 import logging
 import zipfile
+import tarfile
 import codecs
 import locale
 import tempfile
@@ -26,6 +27,7 @@ from .compat import WIN32, get_short_pathname, get_unicode_argv, HAS_CONSOLE
 from .compat import USER_CONFIG_HOME, USER_DATA_HOME
 from .compat import split_quoted
 from . import data
+from .basic.devices.filesystems import MEMORY_MOUNT
 
 
 # minimum required python2 version
@@ -256,8 +258,11 @@ class Settings(object):
         u'hide-listing': {u'type': u'int', u'default': 65535,},
         u'hide-protected': {u'type': u'bool', u'default': False,},
         u'mount': {u'type': u'string', u'list': u'*', u'default': [],},
+        u'overlay': {u'type': u'string', u'list': u'*', u'default': [],},
         u'resume': {u'type': u'bool', u'default': False,},
         u'soft-linefeed': {u'type': u'bool', u'default': False,},
+        u'mmap-files': {u'type': u'bool', u'default': False,},
+        u'mmap-flush': {u'type': u'int', u'default': 0,},
         u'syntax': {
             u'type': u'string', u'choices': (u'advanced', u'pcjr', u'tandy'),
             u'default': u'advanced',},
@@ -527,10 +532,13 @@ class Settings(object):
             'devices': device_params,
             'current_device': current_device,
             'mount': mount_dict,
+            'overlay': self._get_overlays(),
             'serial_buffer_size': self.get('serial-buffer-size'),
             # text file parameters
             'utf8': self.get('utf8'),
             'soft_linefeed': self.get('soft-linefeed'),
+            # random file parameters
+            'mmap_files': self.get('mmap-flush') if self.get('mmap-files') else None,
             # keyboard settings
             'ctrl_c_is_break': self.get('ctrl-c-break'),
             # program parameters
@@ -657,9 +665,17 @@ class Settings(object):
                 try:
                     letter, path = a.split(u':', 1)
                     letter = letter.encode('ascii', errors='replace').upper()
+                    if path.startswith(MEMORY_MOUNT):
+                        # RAM disk, optionally with size
+                        mount_dict[letter] = (path, u'')
+                        continue
                     # take abspath first to ensure unicode, realpath gives bytes for u'.'
                     path = os.path.realpath(os.path.abspath(path))
-                    if not os.path.isdir(path):
+                    # zip and tar files are mounted read-only
+                    is_archive = os.path.isfile(path) and (
+                        zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+                    )
+                    if not os.path.isdir(path) and not is_archive:
                         logging.warning(u'Could not mount %s', a)
                     else:
                         mount_dict[letter] = (path, u'')
@@ -709,6 +725,23 @@ class Settings(object):
         mount_dict[b'@'] = (PROGRAM_PATH, u'')
         return current_device, mount_dict
 
+    def _get_overlays(self):
+        """Assign copy-on-write overlay locations to disk devices."""
+        overlay_dict = {}
+        for a in self.get('overlay', False) or []:
+            try:
+                letter, path = a.split(u':', 1)
+                letter = letter.encode('ascii', errors='replace').upper()
+                if not path.startswith(MEMORY_MOUNT):
+                    path = os.path.realpath(os.path.abspath(path))
+                    if not os.path.isdir(path):
+                        logging.warning(u'Could not use overlay %s', a)
+                        continue
+                overlay_dict[letter] = path
+            except (TypeError, ValueError) as e:
+                logging.warning(u'Could not use overlay %s: %s', a, unicode(e))
+        return overlay_dict
+
     @property
     def conv_params(self):
         """Get parameters for file conversion."""
@@ -0,0 +1,39 @@
+"""
+Time screen output in a double-byte codepage.
+usage: dbcs-benchmark.py [codepage] [repeats]
+"""
+
+import sys
+import os
+import time
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+import pcbasic
+from pcbasic import data
+
+
+# full-width text, box drawing and halfwidth text, mixed
+PROGRAM = b'''
+10 A$ = STRING$(19, 32)
+20 FOR I = 1 TO 19: MID$(A$, I) = CHR$(&HB0 + I MOD 8) + CHR$(&HA1 + I): NEXT
+30 B$ = STRING$(20, &HC4)
+40 FOR I = 1 TO %d
+50 PRINT A$; A$; "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+60 PRINT B$; "TEXT"; B$; STR$(I)
+70 LOCATE 5, 3: PRINT A$;
+80 NEXT
+'''
+
+
+if __name__ == '__main__':
+    codepage_name = sys.argv[1] if len(sys.argv) > 1 else '936'
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    codepage = data.read_codepage(codepage_name)
+    font = data.read_fonts(codepage, [u'unifont', u'univga', u'freedos'], warn=False)
+    with pcbasic.Session(
+            codepage=codepage, font=font, video='vga', input_streams=None, output_streams=None
+        ) as session:
+        session.execute(PROGRAM % (repeats,))
+        start = time.time()
+        session.execute(b'RUN')
+        print 'codepage %s: %d iterations in %.2f s' % (codepage_name, repeats, time.time() - start)
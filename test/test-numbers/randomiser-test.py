@@ -0,0 +1,57 @@
+
+import sys
+import os
+import random
+from binascii import hexlify
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+from pcbasic.basic import values
+
+
+def rnd_by_division(vm, seed):
+    """RND result as computed through Single division."""
+    return vm.new_single().from_int(seed).idiv(vm.new_single().from_int(2**24))
+
+
+if __name__ == '__main__':
+    vm = values.Values(None, False)
+    vm.set_handler(values.FloatErrorHandler(None))
+    rnd = values.Randomiser(vm)
+
+    print 'rnd-seeds'
+    seeds = range(256) + [2**24 - 1 - _i for _i in range(256)] + [2**_i for _i in range(24)]
+    random.seed(0)
+    seeds += [random.randrange(2**24) for _ in range(100000)]
+    failed = 0
+    for seed in seeds:
+        rnd._seed = seed
+        out = rnd.rnd_(iter([values.Integer(None, vm).from_int(0)])).to_bytes()
+        model = rnd_by_division(vm, seed).to_bytes()
+        if out != model:
+            failed += 1
+            print seed, hexlify(out), hexlify(model)
+    print '%d seeds, %d failed' % (len(seeds), failed)
+
+    print 'rnd-sequence'
+    failed = 0
+    for start in range(-500, 500, 7):
+        rnd.clear()
+        rnd.reseed(values.Integer(None, vm).from_int(start))
+        # run a bulk sequence and check against the single-value path, one step at a time
+        buf = bytearray(4 * 200)
+        state = rnd._seed
+        rnd.fill(buf)
+        rnd._seed = state
+        for i in range(200):
+            rnd._cycle(1)
+            model = rnd_by_division(vm, rnd._seed).to_bytes()
+            if buf[4*i:4*i+4] != model:
+                failed += 1
+                print start, i, hexlify(buf[4*i:4*i+4]), hexlify(model)
+        dbuf = bytearray(8 * 10)
+        rnd._seed = state
+        rnd.fill(dbuf, values.DBL)
+        if dbuf[4:8] != buf[:4] or dbuf[:4] != b'\0\0\0\0':
+            failed += 1
+            print start, 'double', hexlify(dbuf[:8]), hexlify(buf[:4])
+    print '%d failed' % (failed,)
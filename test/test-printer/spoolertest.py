@@ -0,0 +1,69 @@
+"""
+Check that printer jobs go through the spooler: flushed on close, errors reported.
+usage: spoolertest.py
+"""
+
+import sys
+import os
+import time
+import logging
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+import pcbasic
+from pcbasic.basic.devices import parports
+
+
+# no keyboard input or screen output
+QUIET = dict(input_streams=None, output_streams=None)
+
+
+def check(name, value, expected):
+    """Report a result."""
+    result = 'ok' if value == expected else 'FAILED, expected %r' % (expected,)
+    print '%-20s %-30r %s' % (name, value, result)
+    return value == expected
+
+
+def slow_print(printbuf, printer):
+    """Stand-in printer that takes its time, and fails on request."""
+    time.sleep(0.2)
+    if b'JAM' in printbuf:
+        raise EnvironmentError('paper jam')
+    printed.append((printer, printbuf))
+
+
+class ErrorLog(logging.Handler):
+    """Keep logged errors."""
+
+    def emit(self, record):
+        """Store the message."""
+        errors.append(record.getMessage())
+
+
+if __name__ == '__main__':
+    passed = True
+    # replace the system printer
+    parports.line_print = slow_print
+    errors = []
+    logging.getLogger().addHandler(ErrorLog(logging.ERROR))
+    # with the default trigger, the job is printed when the device is closed
+    printed = []
+    with pcbasic.Session(devices={b'LPT1:': u'PRINTER:one'}, **QUIET) as session:
+        session.execute(b'LPRINT "HELLO": LPRINT "WORLD"')
+        passed &= check('close: held', printed, [])
+    passed &= check('close: printed', printed, [(u'one', b'HELLO\r\nWORLD\r\n')])
+    # with the line trigger, each line is a job; closing waits for them all
+    printed = []
+    with pcbasic.Session(devices={b'LPT1:': u'PRINTER:two:line'}, **QUIET) as session:
+        session.execute(b'FOR I = 1 TO 3: LPRINT I: NEXT')
+    passed &= check('line: printed', printed, [
+        (u'two', b' 1 \r\n'), (u'two', b' 2 \r\n'), (u'two', b' 3 \r\n')
+    ])
+    # a failed job is logged and doesn't hold up the next one
+    printed = []
+    with pcbasic.Session(devices={b'LPT1:': u'PRINTER:three:line'}, **QUIET) as session:
+        session.execute(b'LPRINT "JAM": LPRINT "AFTER"')
+    passed &= check('error: logged', errors, [u'Error while printing to three: paper jam'])
+    passed &= check('error: next job', printed, [(u'three', b'AFTER\r\n')])
+    print 'all passed' if passed else 'FAILURES'
+    sys.exit(0 if passed else 1)
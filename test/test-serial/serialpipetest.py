@@ -0,0 +1,65 @@
+"""
+Check the in-process serial pipe and loopback COM devices.
+usage: serialpipetest.py
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+import pcbasic
+from pcbasic.basic import open_serial_pipe
+
+
+# no keyboard input or screen output
+QUIET = dict(input_streams=None, output_streams=None)
+
+
+def check(name, value, expected):
+    """Report a result."""
+    result = 'ok' if value == expected else 'FAILED, expected %r' % (expected,)
+    print '%-20s %-30r %s' % (name, value, result)
+    return value == expected
+
+
+def upper(data):
+    """Pipe callback: send back what we receive, in capitals."""
+    received.append(data)
+    return data.upper()
+
+
+if __name__ == '__main__':
+    passed = True
+    # loopback: what is written can be read back
+    with pcbasic.Session(devices={b'COM1:': u'LOOP:'}, **QUIET) as session:
+        session.execute(b'OPEN "COM1:" AS 1: PRINT#1, "HELLO", "WORLD"')
+        passed &= check('LOOP: LOC', session.evaluate(b'LOC(1)'), 25)
+        passed &= check('LOOP: LOF', session.evaluate(b'LOF(1)'), 128 - 25)
+        passed &= check('LOOP: EOF', session.evaluate(b'EOF(1)'), 0)
+        session.execute(b'LINE INPUT#1, A$')
+        passed &= check('LOOP: echo', session.get_variable(b'A$'), b'HELLO' + b' '*14 + b'WORLD')
+        passed &= check('LOOP: EOF after read', session.evaluate(b'EOF(1)'), -1)
+    # named pipe with a Python end that reads and writes directly
+    end = open_serial_pipe(u'direct')
+    with pcbasic.Session(devices={b'COM1:': u'PIPE:direct'}, **QUIET) as session:
+        session.execute(b'OPEN "COM1:" AS 1: PRINT#1, "PING";')
+        passed &= check('PIPE: read', end.read(10), b'PING')
+        end.write(b'PONG')
+        passed &= check('PIPE: LOC', session.evaluate(b'LOC(1)'), 4)
+        passed &= check('PIPE: receive', session.evaluate(b'INPUT$(4, #1)'), b'PONG')
+    # named pipe with a callback on the Python end
+    received = []
+    end = open_serial_pipe(u'callback')
+    end.set_callback(upper)
+    with pcbasic.Session(devices={b'COM2:': u'PIPE:callback'}, **QUIET) as session:
+        session.execute(b'OPEN "COM2:" AS 1: PRINT#1, "abc";')
+        passed &= check('callback: received', received, [b'abc'])
+        passed &= check('callback: reply', session.evaluate(b'INPUT$(LOC(1), #1)'), b'ABC')
+    # two sessions wired to each other
+    with pcbasic.Session(devices={b'COM1:': u'PIPE:between'}, **QUIET) as one:
+        with pcbasic.Session(devices={b'COM1:': u'PIPE:between'}, **QUIET) as two:
+            one.execute(b'OPEN "COM1:" AS 1: PRINT#1, "OVER"')
+            two.execute(b'OPEN "COM1:" AS 1: LINE INPUT#1, A$')
+            passed &= check('sessions', two.get_variable(b'A$'), b'OVER')
+    print 'all passed' if passed else 'FAILURES'
+    sys.exit(0 if passed else 1)